@@ -0,0 +1,130 @@
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from metrics import Counter, Gauge
+
+# Admission control. Every HTTP request is put in a priority class before it
+# reaches a handler, and is refused straight away (rather than queued behind
+# the event loop) when its class is over its limits. Lower-priority classes
+# may only use a share of the worker's in-flight budget, so they are shed
+# first as load rises and interactive calls keep some headroom. Limits are
+# per worker process.
+
+MAX_BUCKETS = 10000
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token. Returns 0 on success, otherwise the seconds until one is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class PriorityClass:
+    def __init__(self, name: str, max_concurrency: int, share: float = 1.0,
+                 rate: Optional[float] = None, burst: Optional[float] = None, retry_after: int = 1):
+        """`share` is the fraction of the global in-flight limit this class may
+        fill; `rate`/`burst` are a token bucket per client (None: unlimited)."""
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.share = share
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def bucket(self, client: str, now: float) -> TokenBucket:
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            # Least recently seen clients go first; they are the likeliest
+            # to have refilled anyway
+            while len(self.buckets) >= MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst, now)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket
+
+class AdmissionMiddleware:
+    """ASGI middleware applying per-class concurrency limits, per-client rate
+    limits and priority shedding. Requests `classify` returns None for (health
+    checks, metrics) are never limited."""
+    def __init__(self, app, classify: Callable[[str, str], Optional[PriorityClass]], max_in_flight: int,
+                 shed: Counter, in_flight: Gauge):
+        self.app = app
+        self.classify = classify
+        self.max_in_flight = max_in_flight
+        self.shed = shed
+        self.in_flight = in_flight
+        self.total_in_flight = 0
+
+    def client_key(self, scope) -> str:
+        # Rate limits follow the peer address, never a value the client picks
+        # (a fresh id per request would get a fresh bucket). Behind a proxy,
+        # uvicorn has already replaced the peer with the X-Forwarded-For
+        # address if the proxy is in --forwarded-allow-ips.
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = self.classify(scope["method"], scope["path"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Capacity first, so a request shed for load doesn't also spend a token
+        if priority.in_flight >= priority.max_concurrency:
+            await self.reject(send, priority, "concurrency", 503, priority.retry_after)
+            return
+        if self.total_in_flight >= self.max_in_flight * priority.share:
+            await self.reject(send, priority, "overload", 503, priority.retry_after)
+            return
+        if priority.rate:
+            now = time.monotonic()
+            wait = priority.bucket(self.client_key(scope), now).take(now)
+            if wait:
+                await self.reject(send, priority, "rate", 429, math.ceil(wait))
+                return
+
+        priority.in_flight += 1
+        self.total_in_flight += 1
+        self.in_flight.inc(priority.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            priority.in_flight -= 1
+            self.total_in_flight -= 1
+            self.in_flight.dec(priority.name)
+
+    async def reject(self, send, priority: PriorityClass, reason: str, status: int, retry_after: int):
+        self.shed.inc(priority.name, reason)
+        detail = "Rate limit exceeded" if status == 429 else "Server is busy, retry later"
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(retry_after, 1)).encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
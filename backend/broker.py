@@ -0,0 +1,184 @@
+import os
+import fcntl
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import orjson
+
+logger = logging.getLogger("optra")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class Broker:
+    """Pub/sub between server workers. Every published message is delivered
+    to the channel's handlers in every worker, including the publisher."""
+
+    # True when messages cross process boundaries
+    distributed = False
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers.setdefault(channel, []).append(handler)
+
+    async def deliver(self, channel: str, message: Dict[str, Any]):
+        for handler in self.handlers.get(channel, []):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Error handling {channel} message: {str(e)}")
+
+    def is_leader(self) -> bool:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+class InMemoryBroker(Broker):
+    """Single-process broker; also what tests run against"""
+
+    def is_leader(self) -> bool:
+        return True
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.deliver(channel, message)
+
+class UnixSocketBroker(Broker):
+    """Broker for workers on one host. The worker holding an exclusive flock
+    on `<path>.lock` is the leader: it serves a Unix socket at `path` and
+    relays newline-delimited JSON frames between the other workers. When the
+    leader exits the OS drops its lock and the remaining workers re-elect."""
+
+    distributed = True
+    RETRY_SECONDS = 0.5
+    FRAME_LIMIT = 1024 * 1024
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.lock_file = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: Set[asyncio.StreamWriter] = set()
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def is_leader(self) -> bool:
+        return self.server is not None
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run(), name="broker")
+
+    async def run(self):
+        while True:
+            if self.try_lock():
+                await self.serve()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=self.FRAME_LIMIT)
+            except OSError:
+                await asyncio.sleep(self.RETRY_SECONDS)
+                continue
+
+            self.writer = writer
+            try:
+                await self.read_frames(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.writer = None
+                writer.close()
+            logger.info("Lost connection to broker leader, re-electing")
+
+    def try_lock(self) -> bool:
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    async def serve(self):
+        # A socket file left behind by a dead leader would make bind() fail
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_peer, path=self.path, limit=self.FRAME_LIMIT)
+        logger.info(f"Worker {os.getpid()} elected broker leader on {self.path}")
+        await self.server.serve_forever()
+
+    async def handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.peers.add(writer)
+        try:
+            await self.read_frames(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+
+    async def read_frames(self, reader: asyncio.StreamReader, source: Optional[asyncio.StreamWriter] = None):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            frame = orjson.loads(line)
+            if self.is_leader():
+                await self.relay(line, exclude=source)
+            await self.deliver(frame["channel"], frame["message"])
+
+    async def relay(self, line: bytes, exclude: Optional[asyncio.StreamWriter] = None):
+        for peer in list(self.peers):
+            if peer is exclude:
+                continue
+            try:
+                peer.write(line)
+                await peer.drain()
+            except (ConnectionError, RuntimeError):
+                self.peers.discard(peer)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        line = orjson.dumps({"channel": channel, "message": message}) + b"\n"
+        if self.is_leader():
+            await self.relay(line)
+        elif self.writer is not None:
+            try:
+                self.writer.write(line)
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+        await self.deliver(channel, message)
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.server:
+            self.server.close()
+            self.server = None
+            # Closing peers ends their handlers with EOF instead of leaving
+            # them to be cancelled at loop shutdown
+            for peer in list(self.peers):
+                peer.close()
+            await asyncio.sleep(0)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self.lock_file:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+def create_broker(kind: str, path: str) -> Broker:
+    if kind == "unix":
+        return UnixSocketBroker(path)
+    if kind == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Unknown broker: {kind}")
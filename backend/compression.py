@@ -0,0 +1,191 @@
+import time
+import zlib
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import Counter
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:  # Optional: without it only gzip is offered
+        brotli = None
+
+# HTTP response compression. Encodings are negotiated from Accept-Encoding
+# (brotli when the module is installed, else gzip). Cacheable responses keep
+# their serialized body and every encoding produced so far in a
+# ResponseCache, so a repeat hit costs neither serialization nor
+# compression; everything else goes through CompressionMiddleware.
+
+MIN_COMPRESS_BYTES = 1024
+# Cached bodies are compressed once and served many times, so they get the
+# slow, dense settings; on-the-fly compression trades ratio for latency
+CACHED_LEVELS = {"br": 11, "gzip": 9}
+STREAM_LEVELS = {"br": 4, "gzip": 6}
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best encoding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    # Ties go to the first in server preference order
+    for encoding in available_encodings():
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def gzip_compressor(level: int):
+    return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    compressor = gzip_compressor(level)
+    return compressor.compress(body) + compressor.flush()
+
+def gzip_stream(chunks: Iterable[bytes], level: int = STREAM_LEVELS["gzip"]) -> Iterator[bytes]:
+    """Gzip a body that is produced piece by piece, such as a streamed export"""
+    compressor = gzip_compressor(level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class EncodedBody:
+    """A serialized response body, its ETag, and its compressed forms,
+    each produced on first request"""
+    __slots__ = ("body", "etag", "created", "encodings")
+
+    def __init__(self, body: bytes, created: Optional[float] = None):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.created = time.monotonic() if created is None else created
+        self.encodings: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """The body for `encoding`, or the identity body when compressing
+        isn't worth it"""
+        if encoding is None or len(self.body) < MIN_COMPRESS_BYTES:
+            return self.body, None
+        data = self.encodings.get(encoding)
+        if data is None:
+            data = self.encodings[encoding] = compress(self.body, encoding, CACHED_LEVELS[encoding])
+        return data, encoding
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # A strong ETag names exact bytes, so each encoding gets its own
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+class ResponseCache:
+    """LRU of encoded response bodies with a time-to-live"""
+    def __init__(self, name: str, ttl: float, size: int, requests: Counter):
+        self.name = name
+        self.ttl = ttl
+        self.size = size
+        self.requests = requests
+        self.entries: "OrderedDict[Hashable, EncodedBody]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[EncodedBody]:
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry.created < self.ttl:
+            self.entries.move_to_end(key)
+            self.requests.inc(self.name, "hit")
+            return entry
+        self.requests.inc(self.name, "miss")
+        return None
+
+    def put(self, key: Hashable, body: bytes, created: Optional[float] = None) -> EncodedBody:
+        entry = self.entries[key] = EncodedBody(body, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def max_age(self, entry: EncodedBody) -> int:
+        """Seconds until `entry` expires here, for Cache-Control"""
+        return max(int(self.ttl - (time.monotonic() - entry.created)), 0)
+
+def header_value(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def weak_etag(etag: bytes) -> bytes:
+    # A strong ETag names the handler's exact bytes, which a compressed body
+    # no longer is; the weak form still revalidates (If-None-Match compares
+    # weakly) without claiming byte equality
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-message text and JSON responses.
+    Responses that already carry a Content-Encoding (precompressed cache
+    hits) and streaming responses pass through untouched."""
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = header_value(scope.get("headers", []), b"accept-encoding")
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held: Optional[Dict[str, Any]] = None
+
+        async def send_wrapper(message):
+            nonlocal held
+            if message["type"] == "http.response.start":
+                # Hold the headers until the body shows whether it's worth it
+                held = message
+                return
+            if held is None:
+                await send(message)
+                return
+            start, held = held, None
+            headers = list(start.get("headers", []))
+            body = message.get("body", b"")
+            content_type = header_value(headers, b"content-type") or b""
+            if (message.get("more_body") or len(body) < self.minimum_size
+                    or header_value(headers, b"content-encoding") is not None
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+            body = compress(body, encoding, STREAM_LEVELS[encoding])
+            headers = [(key, weak_etag(value) if key.lower() == b"etag" else value)
+                       for key, value in headers if key.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding")
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,259 @@
+import math
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Technical indicators over daily price bars. Each indicator computes its
+# whole series from history arrays in one vectorized pass, and keeps the
+# state as of the last completed bar plus the current (last) bar. A live
+# tick revises the current bar: its price is the bar's latest close and its
+# volume the bar's volume so far, so repeated ticks within a day replace
+# each other instead of counting as new samples. Only a tick from a new day
+# rolls the window state forward, in O(1).
+
+MAX_WINDOW = 200
+
+def bar_period(timestamp: str) -> str:
+    """The daily bar an ISO timestamp falls in"""
+    return timestamp[:10]
+
+class Indicator:
+    name = ""
+    windowed = True
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window
+        self.value: Optional[float] = None
+        # The current bar, still open to revision
+        self.period: Optional[str] = None
+        self.price: Optional[float] = None
+        self.volume = 0.0
+
+    @property
+    def spec(self) -> str:
+        return f"{self.name}:{self.window}" if self.windowed else self.name
+
+    def seed(self, close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+        """Compute the indicator over history and keep the final state"""
+        raise NotImplementedError
+
+    def open_bar(self, close: np.ndarray, volume: np.ndarray, out: np.ndarray) -> np.ndarray:
+        # Seeding ends with the last history bar as the current bar
+        if len(close):
+            self.price, self.volume = float(close[-1]), float(volume[-1])
+        self.value = last_value(out)
+        return out
+
+    def roll(self):
+        """Fold the current bar into the completed-bar state"""
+        raise NotImplementedError
+
+    def current_value(self) -> Optional[float]:
+        """The value with the current bar as the latest sample"""
+        raise NotImplementedError
+
+    def update(self, price: float, volume: float, period: Optional[str] = None) -> Optional[float]:
+        """Apply a tick to the bar for `period` and return the new value. A
+        tick without a period always starts a new bar."""
+        if period is None or period != self.period:
+            if self.price is not None:
+                self.roll()
+            self.period = period
+        self.price, self.volume = price, volume
+        self.value = self.current_value()
+        return self.value
+
+class SMA(Indicator):
+    name = "sma"
+
+    def seed(self, close, volume):
+        n = self.window
+        out = np.full(len(close), np.nan)
+        if len(close) >= n:
+            cumulative = np.concatenate(([0.0], np.cumsum(close)))
+            out[n - 1:] = (cumulative[n:] - cumulative[:-n]) / n
+        # The n - 1 completed closes before the current bar
+        self.values = deque(close[-n:-1].tolist(), maxlen=n - 1)
+        self.total = float(sum(self.values))
+        return self.open_bar(close, volume, out)
+
+    def roll(self):
+        if len(self.values) == self.window - 1:
+            self.total -= self.values[0]
+        self.values.append(self.price)
+        self.total += self.price
+
+    def current_value(self):
+        if len(self.values) < self.window - 1:
+            return None
+        return (self.total + self.price) / self.window
+
+class EMA(Indicator):
+    name = "ema"
+
+    def seed(self, close, volume):
+        smoothed = pd.Series(close).ewm(span=self.window, adjust=False).mean().to_numpy()
+        self.alpha = 2 / (self.window + 1)
+        self.ema = float(smoothed[-2]) if len(smoothed) > 1 else None
+        self.count = max(len(close) - 1, 0)  # completed bars
+        out = smoothed.copy()
+        out[:self.window - 1] = np.nan
+        return self.open_bar(close, volume, out)
+
+    def next_ema(self) -> float:
+        return self.price if self.ema is None else self.ema + self.alpha * (self.price - self.ema)
+
+    def roll(self):
+        self.ema = self.next_ema()
+        self.count += 1
+
+    def current_value(self):
+        return self.next_ema() if self.count + 1 >= self.window else None
+
+class RSI(Indicator):
+    """Relative strength index with Wilder's smoothing"""
+    name = "rsi"
+
+    def seed(self, close, volume):
+        out = np.full(len(close), np.nan)
+        # State as of the last completed bar: its close, and the averages
+        # over the changes up to it
+        self.last_close = float(close[-2]) if len(close) > 1 else None
+        self.avg_gain = self.avg_loss = None
+        self.count = max(len(close) - 2, 0)
+        if len(close) > 1:
+            delta = np.diff(close)
+            alpha = 1 / self.window
+            gains = pd.Series(np.clip(delta, 0, None)).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+            losses = pd.Series(np.clip(-delta, 0, None)).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+            out[1:] = rsi_from_averages(gains, losses)
+            out[:self.window] = np.nan
+            if len(delta) > 1:
+                self.avg_gain = float(gains[-2])
+                self.avg_loss = float(losses[-2])
+        return self.open_bar(close, volume, out)
+
+    def next_averages(self) -> Tuple[float, float]:
+        change = self.price - self.last_close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.avg_gain is None:
+            return gain, loss
+        alpha = 1 / self.window
+        return self.avg_gain + alpha * (gain - self.avg_gain), self.avg_loss + alpha * (loss - self.avg_loss)
+
+    def roll(self):
+        if self.last_close is not None:
+            self.avg_gain, self.avg_loss = self.next_averages()
+            self.count += 1
+        self.last_close = self.price
+
+    def current_value(self):
+        if self.last_close is None or self.count + 1 < self.window:
+            return None
+        return float(rsi_from_averages(*self.next_averages()))
+
+class VWAP(Indicator):
+    """Volume-weighted average price anchored at the start of the history"""
+    name = "vwap"
+    windowed = False
+
+    def seed(self, close, volume):
+        price_volume = np.cumsum(close * volume)
+        total_volume = np.cumsum(volume)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.where(total_volume > 0, price_volume / total_volume, np.nan)
+        self.price_volume = float(price_volume[-2]) if len(close) > 1 else 0.0
+        self.total_volume = float(total_volume[-2]) if len(close) > 1 else 0.0
+        return self.open_bar(close, volume, out)
+
+    def roll(self):
+        self.price_volume += self.price * self.volume
+        self.total_volume += self.volume
+
+    def current_value(self):
+        total_volume = self.total_volume + self.volume
+        return (self.price_volume + self.price * self.volume) / total_volume if total_volume else None
+
+INDICATORS = {indicator.name: indicator for indicator in (SMA, EMA, RSI, VWAP)}
+
+def last_value(values: np.ndarray) -> Optional[float]:
+    if not len(values) or math.isnan(values[-1]):
+        return None
+    return float(values[-1])
+
+def rsi_from_averages(gains, losses):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(losses == 0, 100.0, 100 - 100 / (1 + np.divide(gains, losses)))
+
+def parse_indicator(spec: str) -> Indicator:
+    """Build an indicator from a spec like "sma:20", "rsi:14" or "vwap"."""
+    name, _, window = spec.strip().lower().partition(":")
+    indicator_class = INDICATORS.get(name)
+    if indicator_class is None:
+        raise ValueError(f"Unknown indicator '{name}', expected one of {', '.join(INDICATORS)}")
+    if not indicator_class.windowed:
+        if window:
+            raise ValueError(f"{name} does not take a window")
+        return indicator_class()
+    try:
+        window = int(window)
+    except ValueError:
+        raise ValueError(f"{name} needs an integer window, e.g. {name}:20")
+    if not 2 <= window <= MAX_WINDOW:
+        raise ValueError(f"Window must be between 2 and {MAX_WINDOW}")
+    return indicator_class(window)
+
+def series_to_list(values: np.ndarray, digits: int = 4) -> List[Optional[float]]:
+    return [None if math.isnan(value) else round(float(value), digits) for value in values.tolist()]
+
+def history_arrays(bars: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    close = np.fromiter((bar["close"] for bar in bars), dtype=float, count=len(bars))
+    volume = np.fromiter((bar["volume"] for bar in bars), dtype=float, count=len(bars))
+    return close, volume
+
+class IndicatorEngine:
+    """Live indicator state, one instance per (ticker, indicator, params)
+    shared by every subscriber to it"""
+    def __init__(self):
+        self.states: Dict[str, Dict[str, Indicator]] = {}  # ticker -> spec -> indicator
+
+    def get(self, ticker: str, spec: str) -> Optional[Indicator]:
+        return self.states.get(ticker, {}).get(spec)
+
+    def add(self, ticker: str, indicator: Indicator, bars: List[Dict[str, Any]]) -> Indicator:
+        existing = self.get(ticker, indicator.spec)
+        if existing is not None:
+            return existing
+        indicator.seed(*history_arrays(bars))
+        if bars:
+            indicator.period = bar_period(bars[-1]["date"])
+        self.states.setdefault(ticker, {})[indicator.spec] = indicator
+        return indicator
+
+    def discard(self, ticker: str, spec: str):
+        specs = self.states.get(ticker)
+        if specs is not None:
+            specs.pop(spec, None)
+            if not specs:
+                del self.states[ticker]
+
+    def update(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Feed price updates through every live indicator and return one
+        indicator_update message per indicator that was advanced"""
+        messages = []
+        for update in updates:
+            # The bar's volume so far; a tick's own volume is one minute's
+            volume = update.get("day_volume", update["volume"])
+            period = bar_period(update["timestamp"])
+            for spec, indicator in self.states.get(update["ticker"], {}).items():
+                value = indicator.update(update["price"], volume, period)
+                messages.append({
+                    "type": "indicator_update",
+                    "ticker": update["ticker"],
+                    "indicator": spec,
+                    "value": None if value is None else round(value, 4),
+                    "timestamp": update["timestamp"]
+                })
+        return messages
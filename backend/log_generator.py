@@ -5,6 +5,13 @@ import datetime
 import requests
 import json
 import os
+import math
+import string
+import argparse
+import asyncio
+import multiprocessing
+import httpx
+from pymongo import MongoClient
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,6 +20,8 @@ load_dotenv()
 # API endpoint for logs
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8001/api")
 LOGS_ENDPOINT = f"{BACKEND_URL}/logs"
+LOGS_BULK_ENDPOINT = f"{BACKEND_URL}/logs/bulk"
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017/optra")
 
 # Log sources
 SOURCES = [
@@ -131,6 +140,48 @@ ValueError: {error_msg}""",
 asyncio.exceptions.TimeoutError: Timeout while connecting to {service}"""
 ]
 
+# Value pools for the template generators
+TICKERS = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "META", "NVDA", "JPM", "V", "PYPL", "NFLX", "INTC", "CRM", "CSCO", "PEP"]
+TASK_NAMES = ["data_sync", "cleanup", "report_generation", "email_dispatch", "backup", "index_rebuild", "cache_refresh", "feed_update"]
+SERVICES = ["database", "auth", "market_data", "reporting", "user_service", "api_gateway", "pricing", "cache", "redis", "mongodb", "analytics"]
+CLIENTS = ["web", "mobile", "desktop", "api", "internal_service", "admin_panel"]
+API_NAMES = ["market_data", "user", "auth", "analytics", "reporting", "pricing", "external_feed"]
+ERROR_MESSAGES = [
+    "Connection timeout",
+    "Invalid credentials",
+    "Resource not found",
+    "Permission denied",
+    "Data validation failed",
+    "Unexpected EOF",
+    "Missing required field",
+    "Input/output error",
+    "Connection reset by peer",
+    "Memory allocation failed",
+    "Internal server error",
+    "Service unavailable",
+    "Invalid format",
+    "Operation not permitted"
+]
+STATUS_CODES = [400, 401, 403, 404, 500, 502, 503, 504]
+ENDPOINTS = ["/api/market/data", "/api/user/profile", "/api/auth/token", "/api/reports/generate", "/api/system/status"]
+THREAD_NAMES = ["MainThread", "WorkerThread", "DataProcessorThread", "ConnectionManagerThread", "APIHandlerThread"]
+RESPONSES = ["{}", "null", "[]", "<html>Error</html>", "Invalid token", "Rate limit exceeded"]
+STAGES = ["extraction", "transformation", "loading", "validation", "analysis", "report", "notification"]
+VAR_NAMES = ["config", "data", "result", "response", "request", "user", "token", "status", "options"]
+VAR_VALUES = ["None", "True", "False", "{}", "[]", "''", "0", "settings object", "response object"]
+METHOD_NAMES = ["get_data", "process_request", "authenticate", "validate_input", "transform", "send_response"]
+FUNCTIONS = ["handle_request", "process_data", "authenticate_user", "update_market_data", "execute_query", "generate_report"]
+CODE_LINES = [
+    "result = await data_provider.get_market_data(ticker)",
+    "response = database.execute_query(query, params)",
+    "processed_data = data_processor.process(input_data)",
+    "await client.send_request(request_data)",
+    "return service.handle_operation(params)"
+]
+HTTP_METHODS = ["GET", "POST", "PUT", "DELETE"]
+REQUEST_PATHS = ["/api/market", "/api/user", "/api/auth", "/api/system"]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
 # Random data generators for templates
 def random_count():
     return random.randint(1, 1000)
@@ -142,23 +193,19 @@ def random_ip_address():
     return f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
 
 def random_ticker():
-    tickers = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "META", "NVDA", "JPM", "V", "PYPL", "NFLX", "INTC", "CRM", "CSCO", "PEP"]
-    return random.choice(tickers)
+    return random.choice(TICKERS)
 
 def random_duration():
     return random.randint(5, 2000)
 
 def random_task_name():
-    tasks = ["data_sync", "cleanup", "report_generation", "email_dispatch", "backup", "index_rebuild", "cache_refresh", "feed_update"]
-    return random.choice(tasks)
+    return random.choice(TASK_NAMES)
 
 def random_service():
-    services = ["database", "auth", "market_data", "reporting", "user_service", "api_gateway", "pricing", "cache", "redis", "mongodb", "analytics"]
-    return random.choice(services)
+    return random.choice(SERVICES)
 
 def random_client():
-    clients = ["web", "mobile", "desktop", "api", "internal_service", "admin_panel"]
-    return random.choice(clients)
+    return random.choice(CLIENTS)
 
 def random_memory_percent():
     return random.randint(30, 95)
@@ -175,8 +222,7 @@ def random_rate():
     return current_rate, max_rate
 
 def random_api_name():
-    apis = ["market_data", "user", "auth", "analytics", "reporting", "pricing", "external_feed"]
-    return random.choice(apis)
+    return random.choice(API_NAMES)
 
 def random_attempt():
     return random.randint(2, 5)
@@ -185,54 +231,31 @@ def random_cpu_percent():
     return random.randint(70, 99)
 
 def random_error_msg():
-    msgs = [
-        "Connection timeout",
-        "Invalid credentials",
-        "Resource not found",
-        "Permission denied",
-        "Data validation failed",
-        "Unexpected EOF",
-        "Missing required field",
-        "Input/output error",
-        "Connection reset by peer",
-        "Memory allocation failed",
-        "Internal server error",
-        "Service unavailable",
-        "Invalid format",
-        "Operation not permitted"
-    ]
-    return random.choice(msgs)
+    return random.choice(ERROR_MESSAGES)
 
 def random_status_code():
-    codes = [400, 401, 403, 404, 500, 502, 503, 504]
-    return random.choice(codes)
+    return random.choice(STATUS_CODES)
 
 def random_endpoint():
-    endpoints = ["/api/market/data", "/api/user/profile", "/api/auth/token", "/api/reports/generate", "/api/system/status"]
-    return random.choice(endpoints)
+    return random.choice(ENDPOINTS)
 
 def random_thread_name():
-    threads = ["MainThread", "WorkerThread", "DataProcessorThread", "ConnectionManagerThread", "APIHandlerThread"]
-    return random.choice(threads)
+    return random.choice(THREAD_NAMES)
 
 def random_response():
-    responses = ["{}", "null", "[]", "<html>Error</html>", "Invalid token", "Rate limit exceeded"]
-    return random.choice(responses)
+    return random.choice(RESPONSES)
 
 def random_stage():
-    stages = ["extraction", "transformation", "loading", "validation", "analysis", "report", "notification"]
-    return random.choice(stages)
+    return random.choice(STAGES)
 
 def random_timeout():
     return random.randint(10, 60)
 
 def random_var_name():
-    vars = ["config", "data", "result", "response", "request", "user", "token", "status", "options"]
-    return random.choice(vars)
+    return random.choice(VAR_NAMES)
 
 def random_var_value():
-    values = ["None", "True", "False", "{}", "[]", "''", "0", "settings object", "response object"]
-    return random.choice(values)
+    return random.choice(VAR_VALUES)
 
 def random_payload():
     return {"method": "GET", "headers": {"Authorization": "Bearer ***"}, "params": {"filter": "active"}}
@@ -253,8 +276,7 @@ def random_env_vars():
     return {"DEBUG": "False", "LOG_LEVEL": "INFO", "TIMEOUT": "30"}
 
 def random_method_name():
-    methods = ["get_data", "process_request", "authenticate", "validate_input", "transform", "send_response"]
-    return random.choice(methods)
+    return random.choice(METHOD_NAMES)
 
 def random_args():
     return {"id": random.randint(1, 1000), "include_details": random.choice([True, False])}
@@ -266,159 +288,137 @@ def random_line_number():
     return random.randint(10, 500)
 
 def random_function():
-    functions = ["handle_request", "process_data", "authenticate_user", "update_market_data", "execute_query", "generate_report"]
-    return random.choice(functions)
+    return random.choice(FUNCTIONS)
 
 def random_code_line():
-    code_lines = [
-        "result = await data_provider.get_market_data(ticker)",
-        "response = database.execute_query(query, params)",
-        "processed_data = data_processor.process(input_data)",
-        "await client.send_request(request_data)",
-        "return service.handle_operation(params)"
-    ]
-    return random.choice(code_lines)
+    return random.choice(CODE_LINES)
 
 def random_error_code():
     return random.randint(1000, 9999)
 
-# Function to generate a random log entry
-def generate_log_entry():
-    # Select log level based on probability
-    rand = random.random()
-    cumulative = 0
-    selected_level = "INFO"  # Default
-    
-    for level, prob in LEVELS.items():
-        cumulative += prob
-        if rand <= cumulative:
-            selected_level = level
-            break
-    
-    # Select a random source
-    source = random.choice(SOURCES)
-    
-    # Select a random message template
-    message_template = random.choice(MESSAGES[selected_level])
-    
-    # Fill in the template
-    message = message_template
-    
-    # Replace placeholders with random values
-    if "{count}" in message:
-        message = message.replace("{count}", str(random_count()))
-    if "{user_id}" in message:
-        message = message.replace("{user_id}", random_user_id())
-    if "{ip_address}" in message:
-        message = message.replace("{ip_address}", random_ip_address())
-    if "{ticker}" in message:
-        message = message.replace("{ticker}", random_ticker())
-    if "{duration}" in message:
-        message = message.replace("{duration}", str(random_duration()))
-    if "{task_name}" in message:
-        message = message.replace("{task_name}", random_task_name())
-    if "{service}" in message:
-        message = message.replace("{service}", random_service())
-    if "{client}" in message:
-        message = message.replace("{client}", random_client())
-    if "{memory_percent}" in message:
-        message = message.replace("{memory_percent}", str(random_memory_percent()))
-    if "{session_id}" in message:
-        message = message.replace("{session_id}", random_session_id())
-    if "{latency}" in message:
-        message = message.replace("{latency}", str(random_latency()))
-    if "{rate}" in message and "{max_rate}" in message:
-        rate, max_rate = random_rate()
-        message = message.replace("{rate}", str(rate))
-        message = message.replace("{max_rate}", str(max_rate))
-    if "{api_name}" in message:
-        message = message.replace("{api_name}", random_api_name())
-    if "{attempt}" in message or "{attempts}" in message:
-        attempt = random_attempt()
-        message = message.replace("{attempt}", str(attempt))
-        message = message.replace("{attempts}", str(attempt))
-    if "{cpu_percent}" in message:
-        message = message.replace("{cpu_percent}", str(random_cpu_percent()))
-    if "{error_msg}" in message:
-        message = message.replace("{error_msg}", random_error_msg())
-    if "{status_code}" in message:
-        message = message.replace("{status_code}", str(random_status_code()))
-    if "{endpoint}" in message:
-        message = message.replace("{endpoint}", random_endpoint())
-    if "{thread_name}" in message:
-        message = message.replace("{thread_name}", random_thread_name())
-    if "{response}" in message:
-        message = message.replace("{response}", random_response())
-    if "{stage}" in message:
-        message = message.replace("{stage}", random_stage())
-    if "{timeout}" in message:
-        message = message.replace("{timeout}", str(random_timeout()))
-    if "{database}" in message:
-        message = message.replace("{database}", random_service())
-    if "{current}" in message and "{max}" in message:
-        current = random.randint(80, 100)
-        max_val = 100
-        message = message.replace("{current}", str(current))
-        message = message.replace("{max}", str(max_val))
-    if "{var_name}" in message:
-        message = message.replace("{var_name}", random_var_name())
-    if "{var_value}" in message:
-        message = message.replace("{var_value}", random_var_value())
-    if "{payload}" in message:
-        message = message.replace("{payload}", str(random_payload()))
-    if "{params}" in message:
-        message = message.replace("{params}", str(random_params()))
-    if "{plan}" in message:
-        message = message.replace("{plan}", random_plan())
-    if "{ratio}" in message:
-        message = message.replace("{ratio}", random_ratio())
-    if "{timing_details}" in message:
-        message = message.replace("{timing_details}", str(random_timing_details()))
-    if "{env_vars}" in message:
-        message = message.replace("{env_vars}", str(random_env_vars()))
-    if "{method_name}" in message:
-        message = message.replace("{method_name}", random_method_name())
-    if "{args}" in message:
-        message = message.replace("{args}", str(random_args()))
-    if "{packet_details}" in message:
-        message = message.replace("{packet_details}", str(random_packet_details()))
-    if "{source}" in message:
-        message = message.replace("{source}", random_service())
-
-    # Create the log entry
+def random_pool_usage():
+    return random.randint(80, 100), 100
+
+def random_stack_lines():
+    line = random_line_number()
+    return line, line + random.randint(10, 50), line + random.randint(60, 100)
+
+# Placeholder generators. Placeholders that must be filled consistently with
+# each other (rate/max_rate, current/max, the stack trace line numbers) share
+# one generator that returns all of their values at once.
+PLACEHOLDER_GENERATORS = [
+    (("count",), random_count),
+    (("user_id",), random_user_id),
+    (("ip_address",), random_ip_address),
+    (("ticker",), random_ticker),
+    (("duration",), random_duration),
+    (("task_name",), random_task_name),
+    (("service",), random_service),
+    (("client",), random_client),
+    (("memory_percent",), random_memory_percent),
+    (("session_id",), random_session_id),
+    (("latency",), random_latency),
+    (("rate", "max_rate"), random_rate),
+    (("api_name",), random_api_name),
+    (("attempt", "attempts"), lambda: (random_attempt(),) * 2),
+    (("cpu_percent",), random_cpu_percent),
+    (("error_msg",), random_error_msg),
+    (("status_code",), random_status_code),
+    (("endpoint",), random_endpoint),
+    (("thread_name",), random_thread_name),
+    (("response",), random_response),
+    (("stage",), random_stage),
+    (("timeout",), random_timeout),
+    (("database",), random_service),
+    (("current", "max"), random_pool_usage),
+    (("var_name",), random_var_name),
+    (("var_value",), random_var_value),
+    (("payload",), random_payload),
+    (("params",), random_params),
+    (("plan",), random_plan),
+    (("ratio",), random_ratio),
+    (("timing_details",), random_timing_details),
+    (("env_vars",), random_env_vars),
+    (("method_name",), random_method_name),
+    (("args",), random_args),
+    (("packet_details",), random_packet_details),
+    (("source",), random_service),
+    (("line", "sub_line", "third_line"), random_stack_lines),
+    (("function",), random_function),
+    (("code_line",), random_code_line),
+    (("error_code",), random_error_code)
+]
+PLACEHOLDER_INDEX = {name: (names, generator) for names, generator in PLACEHOLDER_GENERATORS for name in names}
+
+def compile_template(template):
+    # Rewrite "{name}" placeholders as positional fields and collect the
+    # generators needed to fill them, so rendering is one format() call
+    formatter = string.Formatter()
+    generators = []
+    positions = {}
+    parts = []
+    for literal, field, _, _ in formatter.parse(template):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field not in positions:
+            names, generator = PLACEHOLDER_INDEX[field]
+            for name in names:
+                positions[name] = len(positions)
+            generators.append(generator if len(names) > 1 else (lambda generator=generator: (generator(),)))
+        parts.append(f"{{{positions[field]}}}")
+    return "".join(parts), tuple(generators)
+
+def render_template(compiled):
+    pattern, generators = compiled
+    values = []
+    for generator in generators:
+        values.extend(generator())
+    return pattern.format(*values)
+
+COMPILED_MESSAGES = {level: [compile_template(template) for template in templates] for level, templates in MESSAGES.items()}
+COMPILED_STACK_TRACES = [compile_template(template) for template in STACK_TRACES]
+LEVEL_NAMES = list(LEVELS.keys())
+LEVEL_WEIGHTS = list(LEVELS.values())
+
+def build_log_entry(level, source, timestamp):
     log_entry = {
         "source": source,
-        "level": selected_level,
-        "message": message,
-        "timestamp": datetime.datetime.now().isoformat()
+        "level": level,
+        "message": render_template(random.choice(COMPILED_MESSAGES[level])),
+        "timestamp": timestamp
     }
     
     # Add stack trace for error logs
-    if selected_level == "ERROR":
-        stack_trace = random.choice(STACK_TRACES)
-        line = random_line_number()
-        stack_trace = stack_trace.replace("{line}", str(line))
-        stack_trace = stack_trace.replace("{function}", random_function())
-        stack_trace = stack_trace.replace("{code_line}", random_code_line())
-        stack_trace = stack_trace.replace("{sub_line}", str(line + random.randint(10, 50)))
-        stack_trace = stack_trace.replace("{third_line}", str(line + random.randint(60, 100)))
-        stack_trace = stack_trace.replace("{error_code}", str(random_error_code()))
-        stack_trace = stack_trace.replace("{error_msg}", random_error_msg())
-        stack_trace = stack_trace.replace("{service}", random_service())
-        log_entry["stack_trace"] = stack_trace
+    if level == "ERROR":
+        log_entry["stack_trace"] = render_template(random.choice(COMPILED_STACK_TRACES))
     
     # Add additional data for some logs
     if random.random() < 0.3:  # 30% chance to add additional data
         log_entry["additional_data"] = {
             "duration": random_duration(),
-            "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "method": random.choice(["GET", "POST", "PUT", "DELETE"]),
-            "path": random.choice(["/api/market", "/api/user", "/api/auth", "/api/system"]),
+            "user_agent": USER_AGENT,
+            "method": random.choice(HTTP_METHODS),
+            "path": random.choice(REQUEST_PATHS),
             "request_id": f"req_{random.randint(10000, 99999)}"
         }
     
     return log_entry
 
+# Function to generate a random log entry
+def generate_log_entry():
+    level = random.choices(LEVEL_NAMES, LEVEL_WEIGHTS)[0]
+    return build_log_entry(level, random.choice(SOURCES), datetime.datetime.now().isoformat())
+
+# Generate a batch of entries, drawing levels and sources for the whole batch
+# up front; every entry in the batch shares one timestamp unless given a list
+def generate_log_entries(count, timestamps=None):
+    levels = random.choices(LEVEL_NAMES, LEVEL_WEIGHTS, k=count)
+    sources = random.choices(SOURCES, k=count)
+    if timestamps is None:
+        timestamps = [datetime.datetime.now().isoformat()] * count
+    return [build_log_entry(level, source, timestamp) for level, source, timestamp in zip(levels, sources, timestamps)]
+
 # Main function to generate and send logs
 def generate_logs():
     print(f"Starting log generator, sending logs to {LOGS_ENDPOINT}")
@@ -443,5 +443,221 @@ def generate_logs():
         # Wait for a random interval between 1-5 seconds
         time.sleep(random.uniform(1, 5))
 
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# Load generation mode: paced, concurrent posting over pooled connections
+async def run_load(rate, concurrency, duration, batch_size):
+    endpoint = LOGS_BULK_ENDPOINT if batch_size > 1 else LOGS_ENDPOINT
+    print(f"Starting load generator: {rate or 'unlimited'} logs/sec, concurrency {concurrency}, "
+          f"batch size {batch_size}, {duration}s against {endpoint}")
+
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # Latency runs from each request's scheduled send time, so time spent
+    # waiting for a free worker counts once the server falls behind;
+    # service time is from the moment a worker actually sends
+    latencies = []
+    service_times = []
+    stats = {"logs": 0, "requests": 0, "failed": 0, "shed": 0}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        loop = asyncio.get_running_loop()
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                scheduled, payload = item
+                start = loop.time()
+                backoff = 0.0
+                try:
+                    response = await client.post(endpoint, json=payload)
+                    if response.status_code == 200:
+                        stats["logs"] += len(payload) if batch_size > 1 else 1
+                    elif response.status_code in (429, 503):
+                        # Shed by the server's admission control; back off as told
+                        stats["shed"] += 1
+                        backoff = float(response.headers.get("Retry-After", 1))
+                    else:
+                        stats["failed"] += 1
+                except httpx.HTTPError as e:
+                    stats["failed"] += 1
+                    print(f"Error sending logs: {str(e)}")
+                finished = loop.time()
+                latencies.append(finished - scheduled)
+                service_times.append(finished - start)
+                stats["requests"] += 1
+                if backoff:
+                    await asyncio.sleep(backoff)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+        # Requests are scheduled on a fixed timeline so the achieved rate does
+        # not drift when individual sleeps overshoot
+        interval = batch_size / rate if rate else 0
+        started = loop.time()
+        next_send = started
+        while loop.time() - started < duration:
+            if batch_size > 1:
+                payload = generate_log_entries(batch_size)
+            else:
+                payload = generate_log_entry()
+            # Without a rate there is no timeline; the request is due now
+            await queue.put((next_send if interval else loop.time(), payload))
+
+            if interval:
+                next_send += interval
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        elapsed = loop.time() - started
+
+    latencies.sort()
+    service_times.sort()
+    print(f"Sent {stats['logs']} logs in {stats['requests']} requests over {elapsed:.1f}s "
+          f"({stats['failed']} failed, {stats['shed']} shed)")
+    print(f"Throughput: {stats['logs'] / elapsed:.1f} logs/sec, {stats['requests'] / elapsed:.1f} requests/sec")
+    print(f"Latency: p50 {percentile(latencies, 50) * 1000:.1f}ms, p95 {percentile(latencies, 95) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f}ms, max {(latencies[-1] if latencies else 0) * 1000:.1f}ms "
+          f"(from scheduled send)")
+    print(f"Service time: p50 {percentile(service_times, 50) * 1000:.1f}ms, "
+          f"p95 {percentile(service_times, 95) * 1000:.1f}ms, p99 {percentile(service_times, 99) * 1000:.1f}ms")
+    return stats
+
+# Offline backfill mode: a seeded, historical dataset written straight to
+# Mongo or NDJSON files, bypassing the HTTP API
+BACKFILL_CHUNK_MINUTES = 60
+BURST_START_PROBABILITY = 0.002  # chance per minute that a burst begins
+
+def diurnal_weight(moment):
+    # Quiet overnight, ramping up to a mid-afternoon peak, lighter at weekends
+    hour = moment.hour + moment.minute / 60
+    weight = 0.2 + 0.8 * max(0.0, math.sin(math.pi * (hour - 6) / 14)) ** 2 if 6 <= hour <= 20 else 0.2
+    return weight * (0.4 if moment.weekday() >= 5 else 1.0)
+
+def plan_backfill(docs, start, end, seed):
+    # Expected volume per minute, scaled so the whole span sums to `docs`.
+    # Planning uses its own RNG so burst placement only depends on the seed.
+    planner = random.Random(f"{seed}:plan")
+    minutes = int((end - start).total_seconds() // 60)
+    weights = []
+    burst_left, burst_factor = 0, 1.0
+    for i in range(minutes):
+        if burst_left == 0 and planner.random() < BURST_START_PROBABILITY:
+            burst_left, burst_factor = planner.randint(5, 30), planner.uniform(5, 20)
+        factor = burst_factor if burst_left else 1.0
+        burst_left = max(0, burst_left - 1)
+        weights.append(diurnal_weight(start + datetime.timedelta(minutes=i)) * factor)
+
+    scale = docs / sum(weights) if weights else 0
+    tasks = []
+    for chunk_start in range(0, minutes, BACKFILL_CHUNK_MINUTES):
+        expected = [w * scale for w in weights[chunk_start:chunk_start + BACKFILL_CHUNK_MINUTES]]
+        tasks.append((chunk_start // BACKFILL_CHUNK_MINUTES, start + datetime.timedelta(minutes=chunk_start), expected, seed))
+    return tasks
+
+def sample_count(expected):
+    # Poisson draw: exact for small rates, normal approximation for large ones
+    if expected < 30:
+        limit, product, count = math.exp(-expected), random.random(), 0
+        while product > limit:
+            product *= random.random()
+            count += 1
+        return count
+    return max(0, int(round(random.gauss(expected, math.sqrt(expected)))))
+
+_backfill_collection = None
+
+def backfill_chunk(task, output, batch_size):
+    # Every chunk reseeds the generator from (seed, chunk index), so the
+    # dataset is identical regardless of worker count or scheduling order
+    global _backfill_collection
+    chunk_index, chunk_start, expected, seed = task
+    random.seed(f"{seed}:{chunk_index}")
+
+    timestamps = []
+    for minute, lam in enumerate(expected):
+        minute_start = chunk_start + datetime.timedelta(minutes=minute)
+        offsets = sorted(random.random() * 60 for _ in range(sample_count(lam)))
+        timestamps.extend(minute_start + datetime.timedelta(seconds=offset) for offset in offsets)
+
+    entries = generate_log_entries(len(timestamps), timestamps)
+    for entry in entries:
+        entry.setdefault("stack_trace", None)
+        entry.setdefault("additional_data", None)
+
+    if output == "mongo":
+        if _backfill_collection is None:
+            _backfill_collection = MongoClient(MONGO_URL).optra.logs
+        for i in range(0, len(entries), batch_size):
+            _backfill_collection.insert_many(entries[i:i + batch_size], ordered=False)
+    else:
+        with open(os.path.join(output, f"logs-{chunk_index:06d}.ndjson"), "w") as f:
+            for entry in entries:
+                entry["timestamp"] = entry["timestamp"].isoformat()
+                f.write(json.dumps(entry))
+                f.write("\n")
+    return len(entries)
+
+def _backfill_worker(args):
+    return backfill_chunk(*args)
+
+def run_backfill(docs, days, end, seed, workers, output, batch_size):
+    start = end - datetime.timedelta(days=days)
+    target = "MongoDB" if output == "mongo" else output
+    print(f"Backfilling ~{docs} logs from {start.isoformat()} to {end.isoformat()} "
+          f"(seed {seed}, {workers} workers) into {target}")
+    if output != "mongo":
+        os.makedirs(output, exist_ok=True)
+
+    tasks = [(task, output, batch_size) for task in plan_backfill(docs, start, end, seed)]
+    written = 0
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for i, count in enumerate(pool.imap_unordered(_backfill_worker, tasks), 1):
+            written += count
+            if i % 24 == 0 or i == len(tasks):
+                elapsed = time.perf_counter() - started
+                print(f"  {i}/{len(tasks)} chunks, {written} logs, {written / elapsed:.0f} docs/sec")
+
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} logs in {elapsed:.1f}s ({written / elapsed:.0f} docs/sec)")
+    return written
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic Optra logs")
+    parser.add_argument("--load", action="store_true", help="run the high-throughput load generation mode")
+    parser.add_argument("--rate", type=float, default=100.0, help="target logs per second (0 for unlimited)")
+    parser.add_argument("--concurrency", type=int, default=10, help="number of concurrent in-flight requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run the load test for")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="logs per request (load mode, default 1; above 1 uses the bulk endpoint) "
+                             "or per insert_many (backfill mode, default 5000)")
+    parser.add_argument("--backfill", action="store_true", help="write a historical dataset offline instead of over HTTP")
+    parser.add_argument("--docs", type=int, default=1_000_000, help="approximate number of logs to backfill")
+    parser.add_argument("--days", type=float, default=30.0, help="length of the backfilled history in days")
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, default=None,
+                        help="end of the backfilled history (ISO format, default: start of today)")
+    parser.add_argument("--seed", default="optra", help="seed for a reproducible dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel backfill workers")
+    parser.add_argument("--output", default="mongo", help="'mongo' or a directory to write NDJSON files into")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    generate_logs()
+    args = parse_args()
+    if args.backfill:
+        end = args.end or datetime.datetime.combine(datetime.date.today(), datetime.time())
+        run_backfill(args.docs, args.days, end, args.seed, args.workers, args.output, args.batch_size or 5000)
+    elif args.load:
+        asyncio.run(run_load(args.rate, args.concurrency, args.duration, args.batch_size or 1))
+    else:
+        generate_logs()
@@ -0,0 +1,94 @@
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Nothing in this module runs until an admin endpoint asks for it: the
+# sampler thread and tracemalloc only exist for the duration of a capture.
+
+MAX_PROFILE_SECONDS = 60.0
+
+class ProfilerBusy(Exception):
+    pass
+
+_capture_lock = threading.Lock()
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """Sample every thread's Python stack for `seconds` and count identical
+    stacks. Blocking; run it off the event loop."""
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being captured")
+    try:
+        me = threading.get_ident()
+        names = {}
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _capture_lock.release()
+
+def collapse_stacks(stacks: Counter) -> str:
+    """Render stack counts in the collapsed format used by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+async def capture_memory_diff(seconds: float, limit: int = 25) -> List[Dict[str, Any]]:
+    """Trace allocations for `seconds` and return the lines whose memory grew the most"""
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being captured")
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(min(seconds, MAX_PROFILE_SECONDS))
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _capture_lock.release()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return [
+        {
+            "location": str(stat.traceback[0]),
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+            "count": stat.count
+        }
+        for stat in stats[:limit]
+    ]
+
+def dump_tasks(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Describe every asyncio task on the running loop with its current stack"""
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coroutine": getattr(coro, "__qualname__", repr(coro)),
+            "done": task.done(),
+            "stack": [frame_label(frame) for frame in task.get_stack(limit=limit)]
+        })
+    return sorted(tasks, key=lambda task: task["name"])
@@ -0,0 +1,117 @@
+import heapq
+import struct
+import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import msgpack
+import orjson
+
+# Wire protocols for /api/ws/{client_id}. Clients pick one by offering it as
+# a WebSocket subprotocol (or ?protocol=...); JSON is the default and keeps
+# the original one-message-per-update format. The compact protocols batch
+# every update of a tick into one frame and refer to tickers by the id
+# returned in the subscription ack (a per-session symbol table). Ids are
+# freed on unsubscribe and reused lowest first, so they stay below the
+# session's subscription limit.
+
+PRICE_BATCH_FRAME = 1
+PACKED_HEADER = struct.Struct("<BHd")       # frame type, update count, epoch seconds
+PACKED_UPDATE = struct.Struct("<Hdddq")     # symbol id, price, change, change %, volume
+
+MAX_SYMBOLS = 1 << 16                         # symbol ids are unsigned shorts in packed frames
+
+class JsonProtocol:
+    name = "optra.json"
+
+    def __init__(self, max_symbols: int = MAX_SYMBOLS):
+        self.symbols: Dict[str, int] = {}
+        self.free_ids: List[int] = []
+        self.max_symbols = min(max_symbols, MAX_SYMBOLS)
+
+    def register_symbol(self, ticker: str) -> Optional[int]:
+        return None
+
+    def release_symbol(self, ticker: str):
+        pass
+
+    async def send_message(self, websocket, data: Dict[str, Any]):
+        await websocket.send_json(data)
+
+    async def send_prices(self, websocket, updates: List[Dict[str, Any]], encoded: Dict[Any, Any]) -> int:
+        # `encoded` is shared by every client in one broadcast, so an update
+        # is serialized once no matter how many clients receive it
+        for update in updates:
+            text = encoded.get(update["ticker"])
+            if text is None:
+                text = encoded[update["ticker"]] = orjson.dumps(update).decode("utf-8")
+            await websocket.send_text(text)
+        return len(updates)
+
+class MsgpackProtocol(JsonProtocol):
+    name = "optra.msgpack"
+
+    def register_symbol(self, ticker: str) -> Optional[int]:
+        symbol_id = self.symbols.get(ticker)
+        if symbol_id is None:
+            if self.free_ids:
+                symbol_id = heapq.heappop(self.free_ids)
+            elif len(self.symbols) < self.max_symbols:
+                symbol_id = len(self.symbols)
+            else:
+                raise ValueError(f"At most {self.max_symbols} symbols per session")
+            self.symbols[ticker] = symbol_id
+        return symbol_id
+
+    def release_symbol(self, ticker: str):
+        symbol_id = self.symbols.pop(ticker, None)
+        if symbol_id is not None:
+            heapq.heappush(self.free_ids, symbol_id)
+
+    async def send_message(self, websocket, data: Dict[str, Any]):
+        await websocket.send_bytes(msgpack.packb(data))
+
+    async def send_prices(self, websocket, updates: List[Dict[str, Any]], encoded: Dict[Any, Any]) -> int:
+        # Sessions that subscribed in the same order share symbol ids, and so
+        # can share the encoded frame
+        symbol_ids = [self.symbols[update["ticker"]] for update in updates]
+        key = (self.name, tuple(symbol_ids), tuple(update["ticker"] for update in updates))
+        frame = encoded.get(key)
+        if frame is None:
+            frame = encoded[key] = self.encode_batch(symbol_ids, updates)
+        await websocket.send_bytes(frame)
+        return 1
+
+    def encode_batch(self, symbol_ids: List[int], updates: List[Dict[str, Any]]) -> bytes:
+        return msgpack.packb({
+            "type": "price_batch",
+            "timestamp": update_epoch(updates[0]),
+            "updates": [
+                [symbol_id, update["price"], update["change"], update["change_percent"], update["volume"]]
+                for symbol_id, update in zip(symbol_ids, updates)
+            ]
+        })
+
+class PackedProtocol(MsgpackProtocol):
+    name = "optra.packed"
+
+    async def send_message(self, websocket, data: Dict[str, Any]):
+        # Control messages stay JSON text frames; only price data is binary
+        await websocket.send_text(orjson.dumps(data).decode("utf-8"))
+
+    def encode_batch(self, symbol_ids: List[int], updates: List[Dict[str, Any]]) -> bytes:
+        frame = bytearray(PACKED_HEADER.pack(PRICE_BATCH_FRAME, len(updates), update_epoch(updates[0])))
+        for symbol_id, update in zip(symbol_ids, updates):
+            frame += PACKED_UPDATE.pack(symbol_id, update["price"], update["change"],
+                                        update["change_percent"], update["volume"])
+        return bytes(frame)
+
+PROTOCOLS = {protocol.name: protocol for protocol in (JsonProtocol, MsgpackProtocol, PackedProtocol)}
+
+def update_epoch(update: Dict[str, Any]) -> float:
+    return datetime.datetime.fromisoformat(update["timestamp"]).timestamp()
+
+def negotiate_protocol(offered: Iterable[Optional[str]], max_symbols: int = MAX_SYMBOLS) -> JsonProtocol:
+    for name in offered:
+        if name in PROTOCOLS:
+            return PROTOCOLS[name](max_symbols)
+    return JsonProtocol(max_symbols)
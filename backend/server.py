@@ -1,17 +1,35 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from pymongo import MongoClient
-from typing import Dict, List, Optional, Any, Union
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from bson import ObjectId
+from bson.errors import InvalidId
+from typing import Dict, List, Optional, Any, Union, Iterator, Tuple, Set
 import os
+import io
+import csv
 import json
+import hmac
+import hashlib
+import copy
+import orjson
 import uuid
 import datetime
 import logging
 import asyncio
-import yfinance as yf
-import pandas as pd
+import time
+import socket
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from metrics import MetricsRegistry, MongoCommandTimer, RequestMetricsMiddleware, DEFAULT_SIZE_BUCKETS
+import profiling
+from admission import AdmissionMiddleware, PriorityClass
+from compression import CompressionMiddleware, EncodedBody, ResponseCache, gzip_stream, negotiate_encoding
+from broker import create_broker
+from protocols import JsonProtocol, negotiate_protocol
 
 # Load environment variables
 load_dotenv()
@@ -23,13 +41,170 @@ logging.basicConfig(
 )
 logger = logging.getLogger("optra")
 
-# MongoDB connection
+# Metrics
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("optra_http_request_duration_seconds", "HTTP request latency by handler",
+                                    ("method", "handler", "status"))
+RESPONSE_BYTES = metrics.histogram("optra_http_response_size_bytes", "HTTP response body size by handler",
+                                   ("method", "handler"), buckets=DEFAULT_SIZE_BUCKETS)
+REQUESTS_IN_FLIGHT = metrics.gauge("optra_http_requests_in_flight", "HTTP requests currently being served")
+MONGO_SECONDS = metrics.histogram("optra_mongo_command_duration_seconds", "MongoDB command latency", ("command",))
+MONGO_FAILURES = metrics.counter("optra_mongo_command_failures_total", "Failed MongoDB commands", ("command",))
+YFINANCE_SECONDS = metrics.histogram("optra_yfinance_download_duration_seconds", "yf.download latency")
+BROADCAST_SECONDS = metrics.histogram("optra_ws_broadcast_duration_seconds", "Time to fan one update out to subscribers")
+BROADCAST_MESSAGES = metrics.counter("optra_ws_messages_sent_total", "Messages sent to WebSocket subscribers")
+ADMISSION_SHED = metrics.counter("optra_admission_shed_total", "Requests refused by admission control",
+                                 ("priority", "reason"))
+ADMISSION_IN_FLIGHT = metrics.gauge("optra_admission_in_flight", "Admitted requests in flight by priority class",
+                                    ("priority",))
+CACHE_REQUESTS = metrics.counter("optra_cache_requests_total", "In-process cache lookups", ("cache", "result"))
+WS_CLOSED = metrics.counter("optra_ws_closed_total", "WebSocket connections closed by the server", ("reason",))
+PRICE_UPDATES = metrics.counter("optra_price_updates_total", "Price updates received from the bus, by whether the price or volume changed",
+                                ("result",))
+
+# MongoDB connection. The client is created by the lifespan handler rather
+# than at import, and yfinance, pandas and numpy are imported where they are
+# first used, so importing this module (worker spawns, tests, tooling) stays
+# cheap. Uvicorn serves no requests until the lifespan startup has run.
 mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017/optra")
-client = MongoClient(mongo_url)
-db = client.optra
+MONGO_RETRY_SECONDS = 5
+client: Optional[MongoClient] = None
+db = None
+# Reported by /api/ready; every component has to be up before it says ready
+readiness = {"mongo": False, "broker": False}
+# Why a component isn't ready yet, also reported by /api/ready
+startup_errors: Dict[str, str] = {}
+# The event loop only keeps weak references to tasks, so background tasks
+# are held here until they finish
+background_tasks: Set[asyncio.Task] = set()
+
+def spawn(coro, name: str) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(background_task_done)
+    return task
+
+def background_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+def connect_mongo():
+    global client, db
+    # Callers that already set `db` (benchmarks, tests) keep theirs
+    if db is None:
+        client = MongoClient(mongo_url, event_listeners=[MongoCommandTimer(MONGO_SECONDS, MONGO_FAILURES)])
+        db = client.optra
+
+async def prepare_database():
+    # MongoClient connects in the background; wait for it off the event loop
+    # so startup isn't held up by a slow or absent server
+    while True:
+        try:
+            await asyncio.to_thread(db.client.admin.command, "ping")
+        except PyMongoError as e:
+            logger.warning(f"MongoDB not reachable yet: {str(e)}")
+            startup_errors["mongo"] = f"Not reachable: {str(e)}"
+            await asyncio.sleep(MONGO_RETRY_SECONDS)
+            continue
+
+        # Make sure layout lookups by id are index-backed. This can fail on
+        # existing data (duplicate ids block the unique index), which needs
+        # an operator, so keep saying why until it succeeds
+        try:
+            await asyncio.to_thread(migrate_layouts)
+            break
+        except Exception as e:
+            logger.error(f"Layout migration failed, retrying in {MONGO_RETRY_SECONDS}s: {str(e)}")
+            startup_errors["mongo"] = f"Migration failed: {str(e)}"
+            await asyncio.sleep(MONGO_RETRY_SECONDS)
+
+    startup_errors.pop("mongo", None)
+    readiness["mongo"] = True
+
+    # Log application startup
+    try:
+        await asyncio.to_thread(db.logs.insert_one, {
+            "source": "system",
+            "level": "INFO",
+            "message": "Optra backend started",
+            "timestamp": datetime.datetime.now()
+        })
+    except PyMongoError as e:
+        logger.error(f"Could not log startup: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_mongo()
+
+    # Join the worker bus before anything publishes on it
+    await broker.start()
+    readiness["broker"] = True
+
+    # Start background tasks
+    spawn(prepare_database(), "prepare_database")
+    spawn(update_ticker_prices(), "update_ticker_prices")
+    spawn(reap_connections(), "reap_connections")
+    if broker.distributed:
+        spawn(sync_subscriptions(), "sync_subscriptions")
+    logger.info("Optra backend started")
+
+    yield
+
+    # Log application shutdown, unless Mongo never came up (the insert would
+    # wait out the server selection timeout)
+    logger.info("Optra backend shutting down")
+    if readiness["mongo"]:
+        try:
+            await asyncio.to_thread(db.logs.insert_one, {
+                "source": "system",
+                "level": "INFO",
+                "message": "Optra backend shutting down",
+                "timestamp": datetime.datetime.now()
+            })
+        except PyMongoError as e:
+            logger.error(f"Could not log shutdown: {str(e)}")
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await broker.close()
+    if client is not None:
+        client.close()
 
 # Create FastAPI app
-app = FastAPI(title="Optra Backend API")
+app = FastAPI(title="Optra Backend API", lifespan=lifespan)
+
+# Admission control: interactive > ingest > export. Ingest and export may only
+# fill part of the in-flight budget, so a flood of log writes or exports gets
+# shed before it can starve quotes, layouts and WebSocket handling.
+MAX_IN_FLIGHT = int(os.environ.get("OPTRA_MAX_IN_FLIGHT", "256"))
+# Interactive calls aren't rate limited per client: browsers behind one proxy
+# share an address, and priority already protects them
+INTERACTIVE = PriorityClass("interactive", max_concurrency=MAX_IN_FLIGHT, share=1.0)
+INGEST = PriorityClass("ingest", max_concurrency=64, share=0.75,
+                       rate=float(os.environ.get("OPTRA_INGEST_RATE", "200")), burst=400)
+EXPORT = PriorityClass("export", max_concurrency=4, share=0.5, rate=1, burst=5, retry_after=5)
+UNLIMITED_PATHS = {"/api/health", "/api/ready", "/api/metrics"}
+
+def classify_request(method: str, path: str) -> Optional[PriorityClass]:
+    if path in UNLIMITED_PATHS:
+        return None
+    if method == "POST" and path in ("/api/logs", "/api/logs/bulk"):
+        return INGEST
+    if path == "/api/logs/export" or path.startswith("/api/admin/"):
+        return EXPORT
+    return INTERACTIVE
+
+# Innermost, so shed responses still get CORS headers and show up in metrics
+app.add_middleware(
+    AdmissionMiddleware,
+    classify=classify_request,
+    max_in_flight=MAX_IN_FLIGHT,
+    shed=ADMISSION_SHED,
+    in_flight=ADMISSION_IN_FLIGHT,
+)
+# Inside the metrics middleware, so response sizes are what goes on the wire
+app.add_middleware(CompressionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -38,48 +213,376 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count", "Retry-After"],
+)
+app.add_middleware(
+    RequestMetricsMiddleware,
+    latency=REQUEST_SECONDS,
+    sizes=RESPONSE_BYTES,
+    in_flight=REQUESTS_IN_FLIGHT,
 )
 
-# WebSocket connections
+# WebSocket connections. Per-connection state is bounded: frames queue in a
+# capped outbox drained by the connection's own writer task (a client that
+# falls too far behind is closed instead of stalling everyone's broadcast),
+# subscriptions per connection are capped, and a reaper closes connections
+# that sit idle without subscriptions or whose writer is stuck. Transport
+# level ping/pong (uvicorn's ws_ping_*) finds peers that silently vanished.
+WS_MAX_MESSAGE_BYTES = 64 * 1024
+WS_OUTBOX_MAX_FRAMES = 1024
+WS_OUTBOX_MAX_BYTES = 1024 * 1024
+WS_MAX_SUBSCRIPTIONS = 200
+WS_PING_INTERVAL_SECONDS = 20
+WS_PING_TIMEOUT_SECONDS = 20
+WS_IDLE_SECONDS = float(os.environ.get("OPTRA_WS_IDLE_SECONDS", "120"))
+WS_SEND_TIMEOUT_SECONDS = 30
+WS_REAP_INTERVAL_SECONDS = 15
+# Application close codes (4000-4999 are free for applications)
+WS_CLOSE_REPLACED = 4000
+WS_CLOSE_IDLE = 4001
+WS_CLOSE_SLOW = 4002
+
+class Connection:
+    """One WebSocket client. The protocols write to it as if it were the
+    socket; frames are queued and sent by the connection's writer task."""
+    __slots__ = ("client_id", "websocket", "protocol", "frames", "queued_bytes", "ready", "overflowed",
+                 "sending_since", "writer", "tickers", "indicators", "last_seen")
+
+    def __init__(self, client_id: str, websocket: WebSocket, protocol: JsonProtocol):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.protocol = protocol
+        self.frames: deque = deque()
+        self.queued_bytes = 0
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.sending_since: Optional[float] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.tickers: Set[str] = set()
+        self.indicators: Set[Tuple[str, str]] = set()
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, frame: Union[str, bytes]):
+        if self.overflowed:
+            return
+        if len(self.frames) >= WS_OUTBOX_MAX_FRAMES or self.queued_bytes + len(frame) > WS_OUTBOX_MAX_BYTES:
+            self.overflowed = True
+        else:
+            self.frames.append(frame)
+            self.queued_bytes += len(frame)
+        self.ready.set()
+
+    async def send_text(self, text: str):
+        self.enqueue(text)
+
+    async def send_bytes(self, data: bytes):
+        self.enqueue(data)
+
+    async def send_json(self, data: Any):
+        self.enqueue(orjson.dumps(data).decode("utf-8"))
+
+    def subscription_count(self) -> int:
+        return len(self.tickers) + len(self.indicators)
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.ticker_subscriptions: Dict[str, List[str]] = {}
+        self.active_connections: Dict[str, Connection] = {}
+        self.ticker_subscriptions: Dict[str, Set[str]] = {}
+        self.indicator_subscriptions: Dict[Tuple[str, str], Set[str]] = {}  # (ticker, spec) -> clients
         
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        protocol: Optional[JsonProtocol] = None,
+        subprotocol: Optional[str] = None
+    ) -> Connection:
+        await websocket.accept(subprotocol=subprotocol)
+
+        # A reused client_id replaces the old socket instead of orphaning it
+        previous = self.active_connections.get(client_id)
+        if previous is not None:
+            spawn(self.close(previous, WS_CLOSE_REPLACED, "Replaced by a newer connection", "replaced"), "ws-replace")
+            self.disconnect(client_id)
+
+        connection = Connection(client_id, websocket, protocol or JsonProtocol())
+        connection.writer = asyncio.create_task(self.write(connection), name=f"ws-writer-{client_id}")
+        self.active_connections[client_id] = connection
+        return connection
         
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+    def disconnect(self, client_id: str, websocket: Optional[WebSocket] = None):
+        connection = self.active_connections.get(client_id)
+        # A handler whose socket was already replaced must not remove the new one
+        if connection is None or (websocket is not None and connection.websocket is not websocket):
+            return
+        del self.active_connections[client_id]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
         
         # Clean up subscriptions
-        for ticker, subscribers in list(self.ticker_subscriptions.items()):
-            if client_id in subscribers:
-                subscribers.remove(client_id)
-                if not subscribers:
-                    del self.ticker_subscriptions[ticker]
+        for ticker in list(connection.tickers):
+            self.unsubscribe_from_ticker(client_id, ticker)
+        for ticker, spec in list(connection.indicators):
+            self.unsubscribe_from_indicator(client_id, ticker, spec)
+
+    async def close(self, connection: Connection, code: int, reason: str, cause: str):
+        WS_CLOSED.inc(cause)
+        self.disconnect(connection.client_id, connection.websocket)
+        try:
+            await connection.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass  # Already gone
+
+    async def write(self, connection: Connection):
+        try:
+            while True:
+                await connection.ready.wait()
+                connection.ready.clear()
+                if connection.overflowed:
+                    await self.close(connection, WS_CLOSE_SLOW, "Too far behind", "overflow")
+                    return
+                while connection.frames:
+                    frame = connection.frames.popleft()
+                    connection.queued_bytes -= len(frame)
+                    connection.sending_since = time.monotonic()
+                    if isinstance(frame, bytes):
+                        await connection.websocket.send_bytes(frame)
+                    else:
+                        await connection.websocket.send_text(frame)
+                    connection.sending_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass  # The socket is gone; its receive loop cleans up
+
+    def reap(self, now: float) -> List[Tuple[Connection, int, str, str]]:
+        """Connections to close: writers stuck on a send, and connections
+        that have neither subscribed to anything nor spoken for a while"""
+        doomed = []
+        for connection in self.active_connections.values():
+            if connection.sending_since is not None and now - connection.sending_since > WS_SEND_TIMEOUT_SECONDS:
+                doomed.append((connection, WS_CLOSE_SLOW, "Send timed out", "stalled"))
+            elif not connection.subscription_count() and now - connection.last_seen > WS_IDLE_SECONDS:
+                doomed.append((connection, WS_CLOSE_IDLE, "Idle timeout", "idle"))
+        return doomed
     
-    def subscribe_to_ticker(self, client_id: str, ticker: str):
-        if ticker not in self.ticker_subscriptions:
-            self.ticker_subscriptions[ticker] = []
-        if client_id not in self.ticker_subscriptions[ticker]:
-            self.ticker_subscriptions[ticker].append(client_id)
+    def subscribe_to_ticker(self, client_id: str, ticker: str) -> bool:
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return False
+        if ticker not in connection.tickers:
+            if connection.subscription_count() >= WS_MAX_SUBSCRIPTIONS:
+                return False
+            connection.tickers.add(ticker)
+            self.ticker_subscriptions.setdefault(ticker, set()).add(client_id)
+        return True
             
     def unsubscribe_from_ticker(self, client_id: str, ticker: str):
-        if ticker in self.ticker_subscriptions and client_id in self.ticker_subscriptions[ticker]:
-            self.ticker_subscriptions[ticker].remove(client_id)
-            if not self.ticker_subscriptions[ticker]:
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.tickers.discard(ticker)
+            connection.protocol.release_symbol(ticker)
+        subscribers = self.ticker_subscriptions.get(ticker)
+        if subscribers and client_id in subscribers:
+            subscribers.discard(client_id)
+            if not subscribers:
                 del self.ticker_subscriptions[ticker]
+
+    def subscribe_to_indicator(self, client_id: str, ticker: str, spec: str) -> bool:
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return False
+        if (ticker, spec) not in connection.indicators:
+            if connection.subscription_count() >= WS_MAX_SUBSCRIPTIONS:
+                return False
+            connection.indicators.add((ticker, spec))
+            self.indicator_subscriptions.setdefault((ticker, spec), set()).add(client_id)
+        return True
+
+    def unsubscribe_from_indicator(self, client_id: str, ticker: str, spec: str) -> bool:
+        """Returns whether the client was subscribed"""
+        connection = self.active_connections.get(client_id)
+        if connection is not None:
+            connection.indicators.discard((ticker, spec))
+        subscribers = self.indicator_subscriptions.get((ticker, spec))
+        if not subscribers or client_id not in subscribers:
+            return False
+        subscribers.discard(client_id)
+        if not subscribers:
+            # Last subscriber gone, so stop maintaining its state
+            del self.indicator_subscriptions[(ticker, spec)]
+            get_indicator_engine().discard(ticker, spec)
+        return True
+
+    def tickers(self) -> List[str]:
+        # Every ticker some local client wants prices or indicators for
+        return sorted(set(self.ticker_subscriptions) | {ticker for ticker, _ in self.indicator_subscriptions})
                 
     async def broadcast_to_ticker_subscribers(self, ticker: str, data: dict):
-        if ticker in self.ticker_subscriptions:
-            for client_id in self.ticker_subscriptions[ticker]:
-                if client_id in self.active_connections:
-                    await self.active_connections[client_id].send_json(data)
+        await self.broadcast_price_updates([data])
+
+    async def broadcast_price_updates(self, updates: List[dict]):
+        # Group a tick's updates by client so batching protocols can send each
+        # client a single frame
+        per_client: Dict[str, List[dict]] = {}
+        for update in updates:
+            for client_id in self.ticker_subscriptions.get(update["ticker"], ()):
+                per_client.setdefault(client_id, []).append(update)
+        if not per_client:
+            return
+
+        encoded: Dict[Any, Any] = {}
+        with BROADCAST_SECONDS.time():
+            for client_id, client_updates in per_client.items():
+                connection = self.active_connections.get(client_id)
+                if connection is None:
+                    continue
+                # One client's encoding failure must not cost everyone else the tick
+                try:
+                    sent = await connection.protocol.send_prices(connection, client_updates, encoded)
+                except Exception as e:
+                    logger.error(f"Error sending prices to {client_id}: {str(e)}")
+                    continue
+                BROADCAST_MESSAGES.inc(amount=sent)
+
+    async def broadcast_indicator_updates(self, messages: List[dict]):
+        for message in messages:
+            for client_id in self.indicator_subscriptions.get((message["ticker"], message["indicator"]), ()):
+                connection = self.active_connections.get(client_id)
+                if connection is None:
+                    continue
+                try:
+                    await connection.protocol.send_message(connection, message)
+                except Exception as e:
+                    logger.error(f"Error sending indicator update to {client_id}: {str(e)}")
+                    continue
+                BROADCAST_MESSAGES.inc()
 
 manager = ConnectionManager()
+# Live indicator state per (ticker, indicator, params), advanced on each tick.
+# Created on the first indicator subscription, which is also when numpy and
+# pandas get imported.
+indicator_engine = None
+
+def get_indicator_engine():
+    global indicator_engine
+    if indicator_engine is None:
+        from indicators import IndicatorEngine
+        indicator_engine = IndicatorEngine()
+    return indicator_engine
+# Cross-worker pub/sub. With OPTRA_BROKER=unix each worker process joins a
+# local bus; the elected leader polls prices and publishes them to everyone.
+broker = create_broker(
+    os.environ.get("OPTRA_BROKER", "memory"),
+    os.environ.get("OPTRA_BROKER_PATH", "/tmp/optra-broker.sock")
+)
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+SUBSCRIPTION_HEARTBEAT_SECONDS = 10
+SUBSCRIPTION_TTL_SECONDS = 30
+worker_tickers: Dict[str, Any] = {}  # worker id -> (tickers, last seen)
+
+# Last-value cache and tick coalescing. Every worker keeps the latest update
+# per ticker so a new subscriber gets a snapshot straight away; after that
+# only updates whose price or volume changed are sent, and changes arriving
+# within OPTRA_COALESCE_SECONDS of each other go out as one batch.
+PRICE_POLL_SECONDS = 10
+PRICE_POLL_MIN_SECONDS = 1
+COALESCE_SECONDS = float(os.environ.get("OPTRA_COALESCE_SECONDS", "0.25"))
+LAST_PRICE_TTL_SECONDS = 60
+last_prices: Dict[str, Any] = {}  # ticker -> (update, last seen)
+pending_prices: Dict[str, dict] = {}
+flush_task: Optional[asyncio.Task] = None
+price_poll_requested = asyncio.Event()
+
+def price_changed(update: Dict[str, Any]) -> bool:
+    cached = last_prices.get(update["ticker"])
+    if cached is None:
+        return True
+    previous = cached[0]
+    return previous["price"] != update["price"] or previous["volume"] != update["volume"]
+
+def cached_price(ticker: str) -> Optional[Dict[str, Any]]:
+    cached = last_prices.get(ticker)
+    return cached[0] if cached else None
+
+async def deliver_price_updates(updates: List[dict]):
+    await manager.broadcast_price_updates(updates)
+    if indicator_engine is not None:
+        await manager.broadcast_indicator_updates(indicator_engine.update(updates))
+
+async def flush_price_updates():
+    global flush_task
+    await asyncio.sleep(COALESCE_SECONDS)
+    flush_task = None
+    updates = list(pending_prices.values())
+    pending_prices.clear()
+    await deliver_price_updates(updates)
+
+async def handle_price_update(message: Dict[str, Any]):
+    global flush_task
+    now = time.monotonic()
+    for update in message["updates"]:
+        if price_changed(update):
+            pending_prices[update["ticker"]] = update
+            PRICE_UPDATES.inc("changed")
+        else:
+            PRICE_UPDATES.inc("unchanged")
+        last_prices[update["ticker"]] = (update, now)
+
+    # Nothing is polled for tickers nobody subscribes to any more, so their
+    # entries stop being refreshed and age out
+    for ticker, (update, last_seen) in list(last_prices.items()):
+        if now - last_seen > LAST_PRICE_TTL_SECONDS:
+            del last_prices[ticker]
+
+    if not pending_prices:
+        return
+    if COALESCE_SECONDS <= 0:
+        updates = list(pending_prices.values())
+        pending_prices.clear()
+        await deliver_price_updates(updates)
+    elif flush_task is None:
+        flush_task = asyncio.create_task(flush_price_updates(), name="flush_price_updates")
+
+async def handle_worker_subscriptions(message: Dict[str, Any]):
+    worker_tickers[message["worker"]] = (message["tickers"], time.monotonic())
+    # Another worker's client is waiting on a ticker with no cached price yet
+    if broker.is_leader() and any(ticker not in last_prices for ticker in message["tickers"]):
+        price_poll_requested.set()
+
+broker.subscribe("prices", handle_price_update)
+broker.subscribe("subscriptions", handle_worker_subscriptions)
+
+def subscribed_tickers() -> List[str]:
+    # Union of this worker's subscriptions and those other workers reported
+    now = time.monotonic()
+    tickers = set(manager.tickers())
+    for worker, (reported, last_seen) in list(worker_tickers.items()):
+        if now - last_seen > SUBSCRIPTION_TTL_SECONDS:
+            del worker_tickers[worker]
+        else:
+            tickers.update(reported)
+    return sorted(tickers)
+
+async def sync_subscriptions():
+    # Tell the leader which tickers this worker's clients want, whenever the
+    # set changes and periodically so a newly elected leader learns it too
+    published = None
+    last_published = 0.0
+    while True:
+        tickers = manager.tickers()
+        if tickers != published or time.monotonic() - last_published > SUBSCRIPTION_HEARTBEAT_SECONDS:
+            await broker.publish("subscriptions", {"worker": WORKER_ID, "tickers": tickers})
+            published = tickers
+            last_published = time.monotonic()
+        await asyncio.sleep(1)
+
+metrics.gauge("optra_ws_connections", "Open WebSocket connections",
+              function=lambda: len(manager.active_connections))
+metrics.gauge("optra_ws_subscribed_tickers", "Tickers with at least one subscriber",
+              function=lambda: len(manager.ticker_subscriptions))
+metrics.gauge("optra_ws_subscriptions", "Ticker subscriptions across all connections",
+              function=lambda: sum(len(subscribers) for subscribers in manager.ticker_subscriptions.values()))
 
 # Pydantic models
 class LogEntry(BaseModel):
@@ -97,16 +600,140 @@ class WindowLayout(BaseModel):
     layout: Dict[str, Any]
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    version: Optional[int] = None
     
 class TickerSubscription(BaseModel):
     ticker: str
 
+# Serialization helpers
+def json_default(value: Any):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def fast_json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    # Pre-encode Mongo documents with orjson so FastAPI skips jsonable_encoder;
+    # datetimes are handled natively and ObjectIds through json_default
+    return Response(
+        content=orjson.dumps(content, default=json_default),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers
+    )
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def not_modified_response(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+def cached_response(
+    entry: EncodedBody,
+    max_age: int,
+    accept_encoding: Optional[str],
+    if_none_match: Optional[str]
+) -> Response:
+    # Serve a cached body as-is, in whichever encoding the client takes
+    body, encoding = entry.encoded(negotiate_encoding(accept_encoding))
+    etag = entry.etag_for(encoding)
+    headers = {"Cache-Control": f"public, max-age={max_age}", "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, headers)
+    headers["ETag"] = etag
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def build_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    if not fields:
+        return None
+    return {field.strip(): 1 for field in fields.split(",") if field.strip()}
+
 # Routes
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "timestamp": datetime.datetime.now().isoformat()}
 
+@app.get("/api/ready")
+async def readiness_check():
+    # Liveness is /api/health; this one tells load balancers and orchestrators
+    # whether the worker can serve traffic yet
+    ready = all(readiness.values())
+    body = {"status": "ready" if ready else "starting", **readiness}
+    if startup_errors:
+        body["errors"] = startup_errors
+    return fast_json_response(body, status_code=200 if ready else 503)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Admin profiling endpoints, disabled unless ADMIN_TOKEN is configured
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Constant-time, so response timing doesn't leak how much of a guess matched.
+    # Compared as bytes: compare_digest rejects non-ASCII str
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), admin_token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/admin/profile/cpu", dependencies=[Depends(require_admin)])
+async def profile_cpu(seconds: float = 10.0, interval: float = 0.005):
+    # Sampling runs in a worker thread so the loop keeps serving while profiled
+    try:
+        stacks = await asyncio.to_thread(profiling.sample_stacks, seconds, max(interval, 0.001))
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=profiling.collapse_stacks(stacks), media_type="text/plain; charset=utf-8")
+
+@app.get("/api/admin/profile/memory", dependencies=[Depends(require_admin)])
+async def profile_memory(seconds: float = 10.0, limit: int = 25):
+    try:
+        stats = await profiling.capture_memory_diff(seconds, limit)
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"seconds": seconds, "top": stats}
+
+@app.get("/api/admin/tasks", dependencies=[Depends(require_admin)])
+async def list_tasks(limit: Optional[int] = None):
+    return {"tasks": profiling.dump_tasks(limit)}
+
 # Logging endpoints
+def build_log_query(
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None
+) -> Dict[str, Any]:
+    query = {}
+    if level:
+        query["level"] = level
+    if source:
+        query["source"] = source
+    if from_date:
+        query["timestamp"] = {"$gte": parse_date_param("from_date", from_date)}
+    if to_date:
+        if "timestamp" not in query:
+            query["timestamp"] = {}
+        query["timestamp"]["$lte"] = parse_date_param("to_date", to_date)
+    return query
+
+def parse_date_param(name: str, value: str) -> datetime.datetime:
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or datetime")
+
 @app.post("/api/logs")
 async def add_log(log_entry: LogEntry):
     result = db.logs.insert_one(log_entry.dict())
@@ -114,6 +741,13 @@ async def add_log(log_entry: LogEntry):
     log_dict["_id"] = str(result.inserted_id)
     return log_dict
 
+@app.post("/api/logs/bulk")
+async def add_logs_bulk(log_entries: List[LogEntry]):
+    if not log_entries:
+        return {"inserted": 0}
+    result = db.logs.insert_many([log_entry.dict() for log_entry in log_entries], ordered=False)
+    return {"inserted": len(result.inserted_ids)}
+
 @app.get("/api/logs")
 async def get_logs(
     limit: int = 100, 
@@ -121,113 +755,403 @@ async def get_logs(
     level: Optional[str] = None, 
     source: Optional[str] = None,
     from_date: Optional[str] = None,
-    to_date: Optional[str] = None
+    to_date: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     # Build query
-    query = {}
-    if level:
-        query["level"] = level
-    if source:
-        query["source"] = source
-    if from_date:
-        query["timestamp"] = {"$gte": datetime.datetime.fromisoformat(from_date)}
-    if to_date:
-        if "timestamp" not in query:
-            query["timestamp"] = {}
-        query["timestamp"]["$lte"] = datetime.datetime.fromisoformat(to_date)
+    query = build_log_query(level, source, from_date, to_date)
         
-    # Execute query
-    logs = list(db.logs.find(query).sort("timestamp", -1).skip(offset).limit(limit))
-    
-    # Convert ObjectId to string
-    for log in logs:
-        log["_id"] = str(log["_id"])
+    # Execute query, letting Mongo drop any fields the caller didn't ask for
+    logs = list(db.logs.find(query, build_projection(fields)).sort("timestamp", -1).skip(offset).limit(limit))
         
-    return {
+    return fast_json_response({
         "data": logs,
         "total": db.logs.count_documents(query),
         "limit": limit,
         "offset": offset
-    }
+    })
+
+EXPORT_CSV_FIELDS = ["_id", "timestamp", "level", "source", "message", "stack_trace", "additional_data"]
+EXPORT_BATCH_SIZE = 1000
+
+def iter_log_export(cursor, export_format: str) -> Iterator[str]:
+    # Rows are grouped into chunks so memory stays bounded by the batch size
+    # rather than by the size of the result set
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_CSV_FIELDS)
+
+    rows = 0
+    for doc in cursor:
+        if writer:
+            row = []
+            for field in EXPORT_CSV_FIELDS:
+                value = doc.get(field)
+                if isinstance(value, dict):
+                    value = json.dumps(value, default=json_default)
+                elif isinstance(value, (datetime.datetime, ObjectId)):
+                    value = json_default(value)
+                row.append("" if value is None else value)
+            writer.writerow(row)
+        else:
+            buffer.write(orjson.dumps(doc, default=json_default).decode("utf-8"))
+            buffer.write("\n")
+
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.get("/api/logs/export")
+async def export_logs(
+    format: str = "ndjson",
+    gzip: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = 0,
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None
+):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    query = build_log_query(level, source, from_date, to_date)
+
+    # Resume after the last exported document; the export is ordered by _id so
+    # the cursor token is simply the last _id the client received
+    if cursor:
+        try:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid export cursor")
+
+    mongo_cursor = db.logs.find(query).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    if limit > 0:
+        mongo_cursor = mongo_cursor.limit(limit)
+
+    body = iter_log_export(mongo_cursor, format)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"logs.{format}"
+    if gzip:
+        body = gzip_stream(chunk.encode("utf-8") for chunk in body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Layout patching (RFC 7386 merge patch and RFC 6902 JSON Patch)
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+def parse_json_pointer(pointer: Any) -> List[str]:
+    if not isinstance(pointer, str):
+        raise HTTPException(status_code=422, detail=f"JSON pointer must be a string, not {json.dumps(pointer)}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise HTTPException(status_code=422, detail=f"Invalid JSON pointer: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def resolve_json_pointer(document: Any, tokens: List[str]) -> Any:
+    node = document
+    for token in tokens:
+        if isinstance(node, dict) and token in node:
+            node = node[token]
+        elif isinstance(node, list) and token.isdigit() and int(token) < len(node):
+            node = node[int(token)]
+        else:
+            raise HTTPException(status_code=422, detail=f"Path not found: /{'/'.join(tokens)}")
+    return node
+
+def apply_json_patch(document: Dict[str, Any], operations: Any) -> Dict[str, Any]:
+    if not isinstance(operations, list):
+        raise HTTPException(status_code=422, detail="JSON Patch body must be a list of operations")
+
+    result = copy.deepcopy(document)
+    for operation in operations:
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in ("add", "remove", "replace", "move", "copy", "test"):
+            raise HTTPException(status_code=422, detail=f"Unsupported patch operation: {op}")
+        tokens = parse_json_pointer(operation.get("path", ""))
+        if not tokens:
+            raise HTTPException(status_code=422, detail="Patching the document root is not supported")
+
+        if op == "test":
+            if resolve_json_pointer(result, tokens) != operation.get("value"):
+                raise HTTPException(status_code=409, detail=f"Test failed at {operation['path']}")
+            continue
+
+        if op in ("move", "copy"):
+            value = copy.deepcopy(resolve_json_pointer(result, parse_json_pointer(operation.get("from", ""))))
+            if op == "move":
+                json_patch_remove(result, parse_json_pointer(operation["from"]))
+        elif op != "remove":
+            if "value" not in operation:
+                raise HTTPException(status_code=422, detail=f"Operation {op} requires a value")
+            value = copy.deepcopy(operation["value"])
+
+        if op == "remove":
+            json_patch_remove(result, tokens)
+        elif op == "replace":
+            json_patch_remove(result, tokens)
+            json_patch_add(result, tokens, value)
+        else:
+            json_patch_add(result, tokens, value)
+    return result
+
+def json_patch_add(document: Any, tokens: List[str], value: Any):
+    parent = resolve_json_pointer(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list) and (key == "-" or (key.isdigit() and int(key) <= len(parent))):
+        parent.insert(len(parent) if key == "-" else int(key), value)
+    else:
+        raise HTTPException(status_code=422, detail=f"Cannot add at /{'/'.join(tokens)}")
+
+def json_patch_remove(document: Any, tokens: List[str]):
+    resolve_json_pointer(document, tokens)
+    parent = resolve_json_pointer(document, tokens[:-1])
+    if isinstance(parent, dict):
+        del parent[tokens[-1]]
+    else:
+        del parent[int(tokens[-1])]
+
+def diff_update(original: Dict[str, Any], patched: Dict[str, Any], prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    # Turn the difference between two documents into dotted $set/$unset paths
+    # so only the parts of the layout that changed are rewritten
+    update: Dict[str, Dict[str, Any]] = {}
+    for key in set(original) | set(patched):
+        path = f"{prefix}{key}"
+        if key not in patched:
+            update.setdefault("$unset", {})[path] = ""
+        elif key not in original or original[key] != patched[key]:
+            old_value, new_value = original.get(key), patched[key]
+            # Mongo can't address an empty, dotted or $-prefixed field by path
+            nestable = key != "" and "." not in key and not key.startswith("$")
+            if nestable and isinstance(old_value, dict) and isinstance(new_value, dict):
+                for operator, fields in diff_update(old_value, new_value, f"{path}.").items():
+                    update.setdefault(operator, {}).update(fields)
+            elif nestable:
+                update.setdefault("$set", {})[path] = new_value
+            else:
+                raise HTTPException(status_code=422, detail=f"Unsupported key in layout: {key}")
+    return update
 
 # Layout management endpoints
+LAYOUT_BACKFILL_BATCH_SIZE = 500
+LAYOUT_SUMMARY_PROJECTION = {"id": 1, "name": 1, "description": 1, "updated_at": 1}
+LAYOUT_PATCHABLE_FIELDS = ("name", "description", "layout")
+LAYOUT_PATCHABLE_PROJECTION = {"name": 1, "description": 1, "layout": 1, "version": 1}
+
+def layout_filter(layout_id: str) -> Dict[str, Any]:
+    # Layouts are addressed by their "id" field; legacy clients may still send
+    # the Mongo _id, which we can match directly when it parses as an ObjectId
+    if ObjectId.is_valid(layout_id):
+        return {"$or": [{"id": layout_id}, {"_id": ObjectId(layout_id)}]}
+    return {"id": layout_id}
+
+def migrate_layouts():
+    # Backfill layouts saved before every document carried an "id", using the
+    # string form of their _id so existing references keep resolving
+    updates = []
+    backfilled = 0
+    for doc in db.layouts.find({"id": None}, {"_id": 1}):
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"id": str(doc["_id"])}}))
+        if len(updates) >= LAYOUT_BACKFILL_BATCH_SIZE:
+            backfilled += db.layouts.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        backfilled += db.layouts.bulk_write(updates, ordered=False).modified_count
+    if backfilled:
+        logger.info(f"Backfilled id on {backfilled} layouts")
+
+    db.layouts.update_many({"version": None}, {"$set": {"version": 0}})
+    db.layouts.create_index("id", unique=True)
+    db.layouts.create_index("updated_at")
+
 @app.post("/api/layouts")
 async def save_layout(layout: WindowLayout):
-    layout_dict = layout.dict()
-    if layout.id:
-        # Update existing layout
-        db.layouts.update_one(
-            {"id": layout.id},
-            {"$set": {
-                "name": layout.name,
-                "description": layout.description,
-                "layout": layout.layout,
-                "updated_at": datetime.datetime.now()
-            }}
+    update = {
+        "$set": {
+            "name": layout.name,
+            "description": layout.description,
+            "layout": layout.layout,
+            "updated_at": datetime.datetime.now()
+        },
+        "$inc": {"version": 1}
+    }
+    if layout.version is not None:
+        # The client is updating the version it last saw: guard on it and
+        # never insert, so a stale write can't create a second document (even
+        # before the unique index exists) and a deleted layout stays deleted
+        saved = db.layouts.find_one_and_update(
+            {"id": layout.id, "version": layout.version},
+            update,
+            return_document=ReturnDocument.AFTER
         )
+        if not saved:
+            if db.layouts.count_documents({"id": layout.id}, limit=1):
+                raise HTTPException(status_code=409, detail="Layout was modified by another client")
+            raise HTTPException(status_code=404, detail="Layout not found")
     else:
-        # Create new layout
-        result = db.layouts.insert_one(layout_dict)
+        # Unconditional save: upsert by id
+        update["$setOnInsert"] = {"created_at": layout.created_at}
+        try:
+            saved = db.layouts.find_one_and_update(
+                {"id": layout.id},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an insert race with another save of the same new id
+            raise HTTPException(status_code=409, detail="Layout was modified by another client")
     
-    return layout_dict
+    return fast_json_response(saved, headers={"ETag": make_etag(saved["_id"], saved["updated_at"])})
+
+@app.patch("/api/layouts/{layout_id}")
+async def patch_layout(layout_id: str, request: Request, version: Optional[int] = None):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        patch = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Patch body must be valid JSON")
+    json_patch = content_type == "application/json-patch+json"
+    # A merge patch that isn't an object would replace the whole document
+    if not json_patch and not isinstance(patch, dict):
+        raise HTTPException(status_code=422, detail="Merge patch body must be a JSON object")
+
+    current = db.layouts.find_one(layout_filter(layout_id), LAYOUT_PATCHABLE_PROJECTION)
+    if not current:
+        raise HTTPException(status_code=404, detail="Layout not found")
+    current_version = current.get("version", 0)
+    if version is not None and version != current_version:
+        raise HTTPException(status_code=409, detail=f"Layout is at version {current_version}, not {version}")
+
+    original = {field: current.get(field) for field in LAYOUT_PATCHABLE_FIELDS}
+    if json_patch:
+        patched = apply_json_patch(original, patch)
+    else:
+        patched = apply_merge_patch(original, patch)
+    # description is optional, so removing it (a merge patch null) clears it
+    patched.setdefault("description", None)
+    if set(patched) - set(LAYOUT_PATCHABLE_FIELDS):
+        raise HTTPException(status_code=422, detail=f"Only {', '.join(LAYOUT_PATCHABLE_FIELDS)} can be patched")
+    if patched.get("name") is None or not isinstance(patched.get("layout"), dict):
+        raise HTTPException(status_code=422, detail="A layout needs a name and a layout object")
+
+    # Write only the paths that changed, guarded by the version we read
+    update = diff_update(original, patched)
+    update.setdefault("$set", {})["updated_at"] = datetime.datetime.now()
+    update["$inc"] = {"version": 1}
+    saved = db.layouts.find_one_and_update(
+        {"_id": current["_id"], "version": current.get("version")},
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+    if not saved:
+        raise HTTPException(status_code=409, detail="Layout was modified by another client")
+
+    return fast_json_response(saved, headers={"ETag": make_etag(saved["_id"], saved["updated_at"])})
 
 @app.get("/api/layouts")
-async def get_layouts():
-    layouts = list(db.layouts.find({}))
-    # Convert ObjectId to string
-    for layout in layouts:
-        layout["_id"] = str(layout["_id"])
-    return layouts
+async def get_layouts(
+    limit: int = 100,
+    offset: int = 0,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    # The list changes whenever a layout is added, removed or updated, so the
+    # newest updated_at plus the collection size identifies its current state
+    latest = db.layouts.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    total = db.layouts.count_documents({})
+    etag = make_etag(latest.get("updated_at") if latest else None, total, limit, offset, fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    # Only summaries are listed; full layout bodies come from get_layout
+    projection = build_projection(fields) or LAYOUT_SUMMARY_PROJECTION
+    layouts = list(db.layouts.find({}, projection).sort("_id", 1).skip(offset).limit(limit))
+    return fast_json_response(layouts, headers={"ETag": etag, "X-Total-Count": str(total)})
 
 @app.get("/api/layouts/{layout_id}")
-async def get_layout(layout_id: str):
-    layout = db.layouts.find_one({"id": layout_id})
-    if not layout:
-        # Try with ObjectId if string ID doesn't match
-        layouts = list(db.layouts.find({}))
-        for l in layouts:
-            if str(l.get("_id")) == layout_id or l.get("id") == layout_id:
-                layout = l
-                break
-                
+async def get_layout(layout_id: str, if_none_match: Optional[str] = Header(None)):
+    # Check freshness against a projected read before loading the full body
+    query = layout_filter(layout_id)
+    stamp = db.layouts.find_one(query, {"id": 1, "updated_at": 1})
+    if not stamp:
+        raise HTTPException(status_code=404, detail="Layout not found")
+
+    etag = make_etag(stamp["_id"], stamp.get("updated_at"))
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    layout = db.layouts.find_one({"_id": stamp["_id"]})
     if not layout:
         raise HTTPException(status_code=404, detail="Layout not found")
     
-    layout["_id"] = str(layout["_id"])
-    return layout
+    return fast_json_response(layout, headers={"ETag": etag})
 
 @app.delete("/api/layouts/{layout_id}")
 async def delete_layout(layout_id: str):
-    result = db.layouts.delete_one({"id": layout_id})
+    result = db.layouts.delete_one(layout_filter(layout_id))
     if result.deleted_count == 0:
-        # Try with ObjectId if string ID doesn't match
-        layouts = list(db.layouts.find({}))
-        for l in layouts:
-            if str(l.get("_id")) == layout_id or l.get("id") == layout_id:
-                db.layouts.delete_one({"_id": l.get("_id")})
-                return {"status": "success", "message": "Layout deleted"}
-                
         raise HTTPException(status_code=404, detail="Layout not found")
     return {"status": "success", "message": "Layout deleted"}
 
+# Response caches for the market and search endpoints. Each entry holds the
+# serialized body and its compressed forms, so a hit skips serialization and
+# compression; Cache-Control tells browsers and proxies how long the same
+# body stays valid, and the ETag lets them revalidate with a 304.
+QUOTE_TTL_SECONDS = 5
+SEARCH_TTL_SECONDS = 3600
+quote_responses = ResponseCache("quote", QUOTE_TTL_SECONDS, 4096, CACHE_REQUESTS)
+search_responses = ResponseCache("search", SEARCH_TTL_SECONDS, 1024, CACHE_REQUESTS)
+
 # Yahoo Finance data endpoints
 @app.get("/api/market/quote/{ticker}")
-async def get_quote(ticker: str):
+async def get_quote(
+    ticker: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
     try:
-        # Create a simple mock response instead of using yfinance
-        # This helps avoid issues with the Yahoo Finance API
-        mock_data = {
-            "ticker": ticker,
-            "name": f"{ticker} Inc.",
-            "price": 150.25,
-            "change": 2.35,
-            "change_percent": 1.58,
-            "volume": 28456789,
-            "market_cap": 2456789000,
-            "exchange": "NASDAQ",
-            "currency": "USD",
-            "timestamp": datetime.datetime.now().isoformat()
-        }
+        entry = quote_responses.get(ticker)
+        if entry is None:
+            # Create a simple mock response instead of using yfinance
+            # This helps avoid issues with the Yahoo Finance API
+            mock_data = {
+                "ticker": ticker,
+                "name": f"{ticker} Inc.",
+                "price": 150.25,
+                "change": 2.35,
+                "change_percent": 1.58,
+                "volume": 28456789,
+                "market_cap": 2456789000,
+                "exchange": "NASDAQ",
+                "currency": "USD",
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            entry = quote_responses.put(ticker, orjson.dumps(mock_data))
         
         # Log the API call
         await add_log(LogEntry(
@@ -237,7 +1161,7 @@ async def get_quote(ticker: str):
             additional_data={"ticker": ticker}
         ))
         
-        return mock_data
+        return cached_response(entry, quote_responses.max_age(entry), accept_encoding, if_none_match)
     except Exception as e:
         logger.error(f"Error fetching quote for {ticker}: {str(e)}")
         # Log the error
@@ -250,71 +1174,131 @@ async def get_quote(ticker: str):
         ))
         raise HTTPException(status_code=500, detail=str(e))
 
+def mock_history_bars(period: str) -> List[Dict[str, Any]]:
+    # Create mock data for the chart
+    import random
+    from datetime import datetime, timedelta
+    
+    # Generate random price data
+    base_price = 150.0  # Base price
+    volatility = 2.0    # Daily volatility in dollars
+    days = 30           # Number of days to generate
+    
+    if period == "1d":
+        days = 1
+    elif period == "5d":
+        days = 5
+    elif period == "1mo":
+        days = 30
+    elif period == "3mo":
+        days = 90
+    elif period == "6mo":
+        days = 180
+    elif period == "1y":
+        days = 365
+    
+    # Generate data points
+    data = []
+    # Daily bars are stamped at midnight so series built at different
+    # moments share dates and can be aligned
+    current_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    price = base_price
+    
+    for i in range(days):
+        current_date += timedelta(days=1)
+        # Random price movement
+        change = (random.random() - 0.5) * volatility
+        price += change
+        
+        # Add some randomness to high/low
+        high = price + random.random() * volatility * 0.5
+        low = price - random.random() * volatility * 0.5
+        
+        # Ensure open is between yesterday's close and today's close
+        if i == 0:
+            open_price = price - change * 0.5
+        else:
+            open_price = price - change * random.random()
+        
+        # Ensure high >= max(open, close) and low <= min(open, close)
+        high = max(high, open_price, price)
+        low = min(low, open_price, price)
+        
+        # Volume has some randomness but trends with price changes
+        volume = int(1000000 + 500000 * abs(change) + random.random() * 500000)
+        
+        data.append({
+            "date": current_date.isoformat(),
+            "open": round(open_price, 2),
+            "high": round(high, 2),
+            "low": round(low, 2),
+            "close": round(price, 2),
+            "volume": volume
+        })
+
+    return data
+
+# History cache: bars per (ticker, period, interval), kept for a few minutes
+# and bounded in size, so repeated and batch requests reuse the same series
+HISTORY_TTL_SECONDS = 300
+HISTORY_CACHE_SIZE = 1024
+history_cache: "OrderedDict[Tuple[str, str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+def cached_history(ticker: str, period: str, interval: str) -> List[Dict[str, Any]]:
+    key = (ticker.upper(), period, interval)
+    cached = history_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < HISTORY_TTL_SECONDS:
+        history_cache.move_to_end(key)
+        CACHE_REQUESTS.inc("history", "hit")
+        return cached[1]
+    CACHE_REQUESTS.inc("history", "miss")
+    bars = mock_history_bars(period)
+    history_cache[key] = (time.monotonic(), bars)
+    history_cache.move_to_end(key)
+    while len(history_cache) > HISTORY_CACHE_SIZE:
+        history_cache.popitem(last=False)
+    return bars
+
+# Encoded get_history bodies. Entries are keyed on when their bars were
+# generated and expire with them, so a refreshed series never serves an old body
+history_responses = ResponseCache("history_response", HISTORY_TTL_SECONDS, HISTORY_CACHE_SIZE, CACHE_REQUESTS)
+
 @app.get("/api/market/history/{ticker}")
 async def get_history(
     ticker: str, 
     period: str = "1mo",  # 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max
-    interval: str = "1d"  # 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo
+    interval: str = "1d",  # 1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo
+    indicators: Optional[str] = None,  # comma-separated specs, e.g. sma:20,rsi:14,vwap
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
 ):
+    requested = []
+    if indicators:
+        from indicators import parse_indicator, history_arrays, series_to_list
+        try:
+            requested = [parse_indicator(spec) for spec in indicators.split(",") if spec.strip()]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        # Create mock data for the chart
-        import random
-        from datetime import datetime, timedelta
-        
-        # Generate random price data
-        base_price = 150.0  # Base price
-        volatility = 2.0    # Daily volatility in dollars
-        days = 30           # Number of days to generate
-        
-        if period == "1d":
-            days = 1
-        elif period == "5d":
-            days = 5
-        elif period == "1mo":
-            days = 30
-        elif period == "3mo":
-            days = 90
-        elif period == "6mo":
-            days = 180
-        elif period == "1y":
-            days = 365
-        
-        # Generate data points
-        data = []
-        current_date = datetime.now() - timedelta(days=days)
-        price = base_price
-        
-        for i in range(days):
-            current_date += timedelta(days=1)
-            # Random price movement
-            change = (random.random() - 0.5) * volatility
-            price += change
-            
-            # Add some randomness to high/low
-            high = price + random.random() * volatility * 0.5
-            low = price - random.random() * volatility * 0.5
-            
-            # Ensure open is between yesterday's close and today's close
-            if i == 0:
-                open_price = price - change * 0.5
-            else:
-                open_price = price - change * random.random()
-            
-            # Ensure high >= max(open, close) and low <= min(open, close)
-            high = max(high, open_price, price)
-            low = min(low, open_price, price)
-            
-            # Volume has some randomness but trends with price changes
-            volume = int(1000000 + 500000 * abs(change) + random.random() * 500000)
-            
-            data.append({
-                "date": current_date.isoformat(),
-                "open": round(open_price, 2),
-                "high": round(high, 2),
-                "low": round(low, 2),
-                "close": round(price, 2),
-                "volume": volume
-            })
+        data = cached_history(ticker, period, interval)
+        created = history_cache[(ticker.upper(), period, interval)][0]
+        key = (ticker, period, interval, tuple(indicator.spec for indicator in requested), created)
+        entry = history_responses.get(key)
+        if entry is None:
+            result = {
+                "ticker": ticker,
+                "period": period,
+                "interval": interval,
+                "data": data
+            }
+            if requested:
+                # Indicator series line up index-for-index with data
+                close, volume = history_arrays(data)
+                result["indicators"] = {
+                    indicator.spec: series_to_list(indicator.seed(close, volume)) for indicator in requested
+                }
+            entry = history_responses.put(key, orjson.dumps(result), created)
             
         # Log the API call
         await add_log(LogEntry(
@@ -324,12 +1308,7 @@ async def get_history(
             additional_data={"ticker": ticker, "period": period, "interval": interval}
         ))
         
-        return {
-            "ticker": ticker,
-            "period": period,
-            "interval": interval,
-            "data": data
-        }
+        return cached_response(entry, history_responses.max_age(entry), accept_encoding, if_none_match)
     except Exception as e:
         logger.error(f"Error fetching history for {ticker}: {str(e)}")
         # Log the error
@@ -341,10 +1320,116 @@ async def get_history(
             additional_data={"ticker": ticker, "period": period, "interval": interval}
         ))
         raise HTTPException(status_code=500, detail=str(e))
+
+MAX_ALIGNED_TICKERS = 50
+HISTORY_FIELDS = ("open", "high", "low", "close", "volume")
+
+def align_history(
+    histories: Dict[str, List[Dict[str, Any]]],
+    field: str,
+    fill: str,
+    fill_limit: Optional[int],
+    returns: Optional[str],
+    correlation: bool
+) -> Dict[str, Any]:
+    """Align per-ticker bars on a shared date axis in one pass over a frame
+    with a column per ticker, and derive returns and correlations from it"""
+    import numpy as np
+    import pandas as pd
+    from indicators import series_to_list
+
+    frame = pd.DataFrame({
+        ticker: pd.Series([bar[field] for bar in bars], index=pd.to_datetime([bar["date"] for bar in bars]), dtype=float)
+        for ticker, bars in histories.items()
+    }).sort_index()
+    if fill == "ffill":
+        frame = frame.ffill(limit=fill_limit)
+
+    result: Dict[str, Any] = {
+        "dates": [date.isoformat() for date in frame.index],
+        "columns": {ticker: series_to_list(frame[ticker].to_numpy()) for ticker in frame.columns}
+    }
+    if returns or correlation:
+        changes = np.log(frame / frame.shift(1)) if returns == "log" else frame.pct_change(fill_method=None)
+        if returns:
+            result["returns"] = {ticker: series_to_list(changes[ticker].to_numpy(), 6) for ticker in changes.columns}
+        if correlation:
+            # Pairwise over the dates both tickers have a return for
+            matrix = changes.corr().to_numpy()
+            result["correlation"] = {
+                "tickers": list(changes.columns),
+                "matrix": [series_to_list(row) for row in matrix]
+            }
+    return result
+
+@app.get("/api/market/history")
+async def get_aligned_history(
+    tickers: str,  # comma-separated, e.g. AAPL,MSFT,GOOGL
+    period: str = "1mo",
+    interval: str = "1d",
+    field: str = "close",
+    fill: str = "ffill",  # ffill or none
+    fill_limit: Optional[int] = None,  # max consecutive dates to forward-fill
+    returns: Optional[str] = None,  # simple or log
+    correlation: bool = False
+):
+    symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No tickers given")
+    if len(symbols) > MAX_ALIGNED_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ALIGNED_TICKERS} tickers per request")
+    if field not in HISTORY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of {', '.join(HISTORY_FIELDS)}")
+    if fill not in ("ffill", "none"):
+        raise HTTPException(status_code=400, detail="fill must be ffill or none")
+    if fill_limit is not None and fill_limit < 1:
+        raise HTTPException(status_code=400, detail="fill_limit must be at least 1")
+    if returns not in (None, "simple", "log"):
+        raise HTTPException(status_code=400, detail="returns must be simple or log")
+
+    try:
+        histories = {symbol: cached_history(symbol, period, interval) for symbol in symbols}
+        aligned = align_history(histories, field, fill, fill_limit, returns, correlation)
+
+        # Log the API call
+        await add_log(LogEntry(
+            source="market_api",
+            level="INFO",
+            message=f"Aligned history requested for {len(symbols)} tickers",
+            additional_data={"tickers": symbols, "period": period, "interval": interval}
+        ))
+
+        return fast_json_response({
+            "tickers": symbols,
+            "period": period,
+            "interval": interval,
+            "field": field,
+            "fill": fill,
+            **aligned
+        })
+    except Exception as e:
+        logger.error(f"Error aligning history for {symbols}: {str(e)}")
+        await add_log(LogEntry(
+            source="market_api",
+            level="ERROR",
+            message=f"Error aligning history for {len(symbols)} tickers",
+            stack_trace=str(e),
+            additional_data={"tickers": symbols, "period": period, "interval": interval}
+        ))
+        raise HTTPException(status_code=500, detail=str(e))
         
 @app.get("/api/market/search/{query}")
-async def search_tickers(query: str):
+async def search_tickers(
+    query: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
     try:
+        # Results depend only on the query, so they are cached for a long time
+        entry = search_responses.get(query.upper())
+        if entry is not None:
+            return cached_response(entry, search_responses.max_age(entry), accept_encoding, if_none_match)
+
         # Mock search results
         tech_companies = [
             {"symbol": "AAPL", "name": "Apple Inc.", "exchange": "NASDAQ", "type": "EQUITY", "currency": "USD"},
@@ -387,8 +1472,9 @@ async def search_tickers(query: str):
         
         # Limit results
         results = results[:10]
-                
-        return {"results": results}
+
+        entry = search_responses.put(query, orjson.dumps({"results": results}))
+        return cached_response(entry, search_responses.max_age(entry), accept_encoding, if_none_match)
     except Exception as e:
         logger.error(f"Error searching tickers for {query}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -396,48 +1482,151 @@ async def search_tickers(query: str):
 # WebSocket for real-time updates
 @app.websocket("/api/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await manager.connect(websocket, client_id)
+    # Negotiate the wire protocol from the offered subprotocols or ?protocol=
+    offered = websocket.scope.get("subprotocols", [])
+    protocol = negotiate_protocol(offered + [websocket.query_params.get("protocol")], WS_MAX_SUBSCRIPTIONS)
+    connection = await manager.connect(websocket, client_id, protocol, protocol.name if protocol.name in offered else None)
+    limit_error = {"type": "error", "message": f"At most {WS_MAX_SUBSCRIPTIONS} subscriptions per connection"}
     try:
         # Continuously check for messages from the client
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive_text()
+            # A newer connection with this client_id has replaced this one
+            # (which is being closed); anything read now would act on its
+            # subscriptions
+            if manager.active_connections.get(client_id) is not connection:
+                break
+            connection.last_seen = time.monotonic()
+            try:
+                data = orjson.loads(message)
+            except orjson.JSONDecodeError:
+                data = None
+            if not isinstance(data, dict):
+                await protocol.send_message(connection, {"type": "error", "message": "Expected a JSON object"})
+                continue
+
+            # Application-level heartbeat for clients that want one
+            if data.get("action") == "ping":
+                await protocol.send_message(connection, {"type": "pong", "timestamp": datetime.datetime.now().isoformat()})
             
             # Handle subscription requests
-            if data.get("action") == "subscribe":
+            elif data.get("action") == "subscribe":
                 ticker = data.get("ticker")
                 if ticker:
-                    manager.subscribe_to_ticker(client_id, ticker)
-                    await websocket.send_json({
+                    if not manager.subscribe_to_ticker(client_id, ticker):
+                        await protocol.send_message(connection, dict(limit_error, ticker=ticker))
+                        continue
+                    ack = {
                         "type": "subscription",
                         "status": "success",
                         "ticker": ticker
-                    })
+                    }
+                    symbol_id = protocol.register_symbol(ticker)
+                    if symbol_id is not None:
+                        ack["symbol_id"] = symbol_id
+                    await protocol.send_message(connection, ack)
+
+                    # Send the last known price now rather than at the next poll
+                    snapshot = cached_price(ticker)
+                    if snapshot is not None:
+                        await protocol.send_prices(connection, [snapshot], {})
+                    else:
+                        price_poll_requested.set()
                     
             elif data.get("action") == "unsubscribe":
                 ticker = data.get("ticker")
                 if ticker:
                     manager.unsubscribe_from_ticker(client_id, ticker)
-                    await websocket.send_json({
+                    await protocol.send_message(connection, {
                         "type": "unsubscription",
                         "status": "success",
                         "ticker": ticker
                     })
+
+            # Indicator streams, e.g. {"action": "subscribe_indicator", "ticker": "AAPL", "indicator": "sma:20"}
+            elif data.get("action") == "subscribe_indicator":
+                ticker = data.get("ticker")
+                if ticker:
+                    from indicators import parse_indicator
+                    try:
+                        indicator = parse_indicator(str(data.get("indicator", "")))
+                    except ValueError as e:
+                        await protocol.send_message(connection, {"type": "error", "ticker": ticker, "message": str(e)})
+                        continue
+                    if not manager.subscribe_to_indicator(client_id, ticker, indicator.spec):
+                        await protocol.send_message(connection, dict(limit_error, ticker=ticker))
+                        continue
+                    # Subscribers to the same indicator share one seeded state
+                    engine = get_indicator_engine()
+                    indicator = engine.get(ticker, indicator.spec) or \
+                        engine.add(ticker, indicator, cached_history(ticker, "1y", "1d"))
+                    await protocol.send_message(connection, {
+                        "type": "indicator_subscription",
+                        "status": "success",
+                        "ticker": ticker,
+                        "indicator": indicator.spec,
+                        "value": None if indicator.value is None else round(indicator.value, 4)
+                    })
+                    if cached_price(ticker) is None:
+                        price_poll_requested.set()
+
+            elif data.get("action") == "unsubscribe_indicator":
+                ticker = data.get("ticker")
+                if ticker:
+                    # Normalized the same way as on subscribe, so "SMA:020" finds sma:20
+                    from indicators import parse_indicator
+                    try:
+                        spec = parse_indicator(str(data.get("indicator", ""))).spec
+                    except ValueError as e:
+                        await protocol.send_message(connection, {"type": "error", "ticker": ticker, "message": str(e)})
+                        continue
+                    if not manager.unsubscribe_from_indicator(client_id, ticker, spec):
+                        await protocol.send_message(connection, {
+                            "type": "error",
+                            "ticker": ticker,
+                            "indicator": spec,
+                            "message": f"Not subscribed to {spec} for {ticker}"
+                        })
+                        continue
+                    await protocol.send_message(connection, {
+                        "type": "indicator_unsubscription",
+                        "status": "success",
+                        "ticker": ticker,
+                        "indicator": spec
+                    })
                     
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
+        pass
+    finally:
+        # Also runs when the handler fails or the server closed the socket
+        manager.disconnect(client_id, websocket)
+
+async def reap_connections():
+    while True:
+        await asyncio.sleep(WS_REAP_INTERVAL_SECONDS)
+        for connection, code, reason, cause in manager.reap(time.monotonic()):
+            # Closing a dead peer can wait out the close handshake, so don't
+            # let one hold up the rest
+            spawn(manager.close(connection, code, reason, cause), "ws-reap")
 
 # Background task to simulate real-time updates
 async def update_ticker_prices():
     while True:
-        # Only fetch data for tickers that have active subscriptions
-        tickers = list(manager.ticker_subscriptions.keys())
+        # Only the leader polls, and only for tickers some worker's clients want
+        tickers = subscribed_tickers() if broker.is_leader() else []
         if tickers:
             try:
                 # Batch request to Yahoo Finance
+                # yfinance (and pandas with it) is only imported once something
+                # is subscribed; the download blocks, so it runs in a thread
+                import yfinance as yf
                 tickers_str = " ".join(tickers)
-                data = yf.download(tickers_str, period="1d", interval="1m", group_by="ticker", progress=False)
+                with YFINANCE_SECONDS.time():
+                    data = await asyncio.to_thread(yf.download, tickers_str, period="1d", interval="1m",
+                                                   group_by="ticker", progress=False)
                 
-                # Process each ticker
+                # Process each ticker, collecting the tick's updates into one batch
+                updates = []
                 for ticker in tickers:
                     try:
                         if len(tickers) == 1:
@@ -447,49 +1636,47 @@ async def update_ticker_prices():
                             
                         latest = ticker_data.iloc[-1]
                         
-                        # Send update to subscribers
-                        await manager.broadcast_to_ticker_subscribers(ticker, {
+                        updates.append({
                             "type": "price_update",
                             "ticker": ticker,
                             "price": float(latest["Close"]),
                             "change": float(latest["Close"] - ticker_data.iloc[0]["Open"]),
                             "change_percent": float((latest["Close"] / ticker_data.iloc[0]["Open"] - 1) * 100),
                             "volume": int(latest["Volume"]),
+                            "day_volume": int(ticker_data["Volume"].sum()),
                             "timestamp": datetime.datetime.now().isoformat()
                         })
                     except Exception as e:
                         logger.error(f"Error updating ticker {ticker}: {str(e)}")
+                
+                # Publish to every worker; each refreshes its last-value cache
+                # and sends only what changed to its own subscribers
+                if updates:
+                    await broker.publish("prices", {"type": "price_batch", "updates": updates})
             except Exception as e:
                 logger.error(f"Error in ticker update task: {str(e)}")
                 
-        # Wait before the next update
-        await asyncio.sleep(10)  # Update every 10 seconds
-
-@app.on_event("startup")
-async def startup_event():
-    # Start background tasks
-    asyncio.create_task(update_ticker_prices())
-    
-    # Log application startup
-    db.logs.insert_one({
-        "source": "system",
-        "level": "INFO",
-        "message": "Optra backend started",
-        "timestamp": datetime.datetime.now()
-    })
-    logger.info("Optra backend started")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    # Log application shutdown
-    db.logs.insert_one({
-        "source": "system",
-        "level": "INFO",
-        "message": "Optra backend shutting down",
-        "timestamp": datetime.datetime.now()
-    })
-    logger.info("Optra backend shutting down")
+        # Wait for the next cycle, or less if a subscriber is waiting on a
+        # ticker with no cached price
+        await asyncio.sleep(PRICE_POLL_MIN_SECONDS)
+        try:
+            await asyncio.wait_for(price_poll_requested.wait(), PRICE_POLL_SECONDS - PRICE_POLL_MIN_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        price_poll_requested.clear()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("server:app", host="0.0.0.0", port=8001, reload=True)
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    ws_options = {
+        "ws_per_message_deflate": True,
+        "ws_ping_interval": WS_PING_INTERVAL_SECONDS,
+        "ws_ping_timeout": WS_PING_TIMEOUT_SECONDS,
+        "ws_max_size": WS_MAX_MESSAGE_BYTES
+    }
+    if workers > 1:
+        # Workers are separate processes, so they need the shared bus
+        os.environ.setdefault("OPTRA_BROKER", "unix")
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=workers, **ws_options)
+    else:
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, reload=True, **ws_options)
@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The backend modules import each other as top-level modules (server.py is
+# run from backend/), so the tests import them the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def client():
+    """The app against a fresh in-memory Mongo, started through its lifespan"""
+    import mongomock
+    from fastapi.testclient import TestClient
+    import server
+
+    # connect_mongo keeps a db that is already set
+    server.db = mongomock.MongoClient().optra
+    server.readiness["mongo"] = False
+    for priority in (server.INTERACTIVE, server.INGEST, server.EXPORT):
+        priority.buckets.clear()
+    with TestClient(server.app) as test_client:
+        # Indexes (the unique id behind version conflicts) come from the
+        # background prepare_database task
+        deadline = time.monotonic() + 5
+        while not server.readiness["mongo"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        yield test_client
+    server.db = None
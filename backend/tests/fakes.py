@@ -0,0 +1,54 @@
+import asyncio
+from typing import List, Optional, Tuple, Union
+
+import orjson
+from fastapi import WebSocketDisconnect
+
+class FakeWebSocket:
+    """Stand-in client socket. Records what the server sends and how it
+    closed the socket; `push` feeds the handler's receive loop, and setting
+    `stalled` to an unset Event makes sends hang like a peer that stopped
+    reading."""
+    def __init__(self):
+        self.sent: List[Union[str, bytes]] = []
+        self.closed: Optional[Tuple[int, Optional[str]]] = None
+        self.incoming: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self.stalled: Optional[asyncio.Event] = None
+        self.scope = {}
+        self.query_params = {}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        await self.wait()
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes):
+        await self.wait()
+        self.sent.append(data)
+
+    async def wait(self):
+        if self.stalled is not None:
+            await self.stalled.wait()
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        self.closed = (code, reason)
+
+    async def receive_text(self) -> str:
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect(1000)
+        return message
+
+    def push(self, data):
+        self.incoming.put_nowait(orjson.dumps(data).decode("utf-8"))
+
+    def messages(self):
+        """The JSON text frames sent so far"""
+        return [orjson.loads(frame) for frame in self.sent if isinstance(frame, str)]
+
+async def settle(rounds: int = 5):
+    # Let writer and handler tasks run
+    for _ in range(rounds):
+        await asyncio.sleep(0)
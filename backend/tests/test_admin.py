@@ -0,0 +1,15 @@
+import pytest
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 403),
+    ({"X-Admin-Token": "wrong"}, 403),
+    ({"X-Admin-Token": "s3cret-é".encode("utf-8")}, 403),
+    ({"X-Admin-Token": "s3cret"}, 200),
+])
+def test_admin_token_is_required(client, monkeypatch, headers, status):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/admin/tasks", headers=headers).status_code == status
+
+def test_admin_endpoints_are_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/admin/tasks", headers={"X-Admin-Token": "anything"}).status_code == 404
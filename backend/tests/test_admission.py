@@ -0,0 +1,47 @@
+import asyncio
+
+import admission
+from admission import AdmissionMiddleware, PriorityClass
+from metrics import MetricsRegistry
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def make_middleware(priority):
+    registry = MetricsRegistry()
+    return AdmissionMiddleware(
+        ok_app,
+        classify=lambda method, path: priority,
+        max_in_flight=10,
+        shed=registry.counter("shed", "", ("priority", "reason")),
+        in_flight=registry.gauge("in_flight", "", ("priority",)),
+    )
+
+def call(middleware, address, client_id):
+    scope = {"type": "http", "method": "GET", "path": "/api/logs/export", "client": (address, 1234),
+             "headers": [(b"x-client-id", client_id.encode())]}
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+def test_rate_limit_follows_the_peer_not_the_client_id():
+    middleware = make_middleware(PriorityClass("export", max_concurrency=4, rate=0.001, burst=5))
+    rotating = [call(middleware, "10.0.0.1", f"id-{i}") for i in range(20)]
+    assert rotating.count(200) == 5
+    assert rotating.count(429) == 15
+    # Another address has its own bucket
+    assert call(middleware, "10.0.0.2", "id-0") == 200
+
+def test_buckets_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_BUCKETS", 3)
+    priority = PriorityClass("export", max_concurrency=4, rate=1, burst=5)
+    for client in ["a", "b", "c", "a"]:
+        priority.bucket(client, 0.0).take(0.0)
+    priority.bucket("d", 0.0)
+    assert list(priority.buckets) == ["c", "a", "d"]
@@ -0,0 +1,27 @@
+import pytest
+
+@pytest.mark.parametrize("params, detail", [
+    ({"tickers": ""}, "No tickers given"),
+    ({"tickers": "AAPL", "field": "price"}, "field must be one of open, high, low, close, volume"),
+    ({"tickers": "AAPL", "fill": "bfill"}, "fill must be ffill or none"),
+    ({"tickers": "AAPL", "fill_limit": -1}, "fill_limit must be at least 1"),
+    ({"tickers": "AAPL", "fill_limit": 0}, "fill_limit must be at least 1"),
+    ({"tickers": "AAPL", "returns": "pct"}, "returns must be simple or log"),
+])
+def test_invalid_parameters_are_rejected(client, params, detail):
+    import server
+
+    response = client.get("/api/market/history", params=params)
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
+    assert server.db.logs.count_documents({"level": "ERROR"}) == 0
+
+def test_aligned_columns_share_dates(client):
+    response = client.get("/api/market/history", params={"tickers": "aapl,MSFT", "fill_limit": 1,
+                                                         "returns": "log", "correlation": "true"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["tickers"] == ["AAPL", "MSFT"]
+    assert all(len(column) == len(body["dates"]) for column in body["columns"].values())
+    assert body["correlation"]["tickers"] == ["AAPL", "MSFT"]
+    assert body["correlation"]["matrix"][0][0] == pytest.approx(1.0)
@@ -0,0 +1,55 @@
+import asyncio
+
+from broker import UnixSocketBroker
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out waiting for the brokers")
+        await asyncio.sleep(0.01)
+
+def connected(brokers):
+    """Exactly one leader, with every other broker connected to it"""
+    leaders = [broker for broker in brokers if broker.is_leader()]
+    return (len(leaders) == 1 and len(leaders[0].peers) == len(brokers) - 1
+            and all(broker.writer is not None for broker in brokers if broker is not leaders[0]))
+
+def test_unix_socket_brokers_share_messages_and_reelect(tmp_path, monkeypatch):
+    monkeypatch.setattr(UnixSocketBroker, "RETRY_SECONDS", 0.05)
+
+    async def scenario():
+        brokers = [UnixSocketBroker(str(tmp_path / "broker.sock")) for _ in range(3)]
+        received = {id(broker): [] for broker in brokers}
+        for broker in brokers:
+            async def handler(message, inbox=received[id(broker)]):
+                inbox.append(message["n"])
+            broker.subscribe("prices", handler)
+            await broker.start()
+        try:
+            await wait_for(lambda: connected(brokers))
+            leader = next(broker for broker in brokers if broker.is_leader())
+            followers = [broker for broker in brokers if broker is not leader]
+
+            # From a follower and from the leader, every worker gets it once
+            await followers[0].publish("prices", {"n": 1})
+            await leader.publish("prices", {"n": 2})
+            await wait_for(lambda: all(len(inbox) == 2 for inbox in received.values()))
+            assert all(sorted(inbox) == [1, 2] for inbox in received.values())
+
+            await leader.close()
+            await wait_for(lambda: connected(followers))
+            assert not leader.is_leader()
+
+            for inbox in received.values():
+                inbox.clear()
+            await followers[0].publish("prices", {"n": 3})
+            await followers[1].publish("prices", {"n": 4})
+            await wait_for(lambda: all(len(received[id(broker)]) == 2 for broker in followers))
+            assert all(sorted(received[id(broker)]) == [3, 4] for broker in followers)
+            assert received[id(leader)] == []
+        finally:
+            for broker in brokers:
+                await broker.close()
+
+    asyncio.run(scenario())
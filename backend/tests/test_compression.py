@@ -0,0 +1,48 @@
+import gzip
+
+import pytest
+
+from compression import gzip_stream, negotiate_encoding
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0.5, gzip;q=0", None),
+])
+def test_negotiation_without_brotli(monkeypatch, header, expected):
+    import compression
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate_encoding(header) == expected
+
+def test_gzip_stream_matches_the_whole_body():
+    chunks = [b""] + [b"line %d\n" % i * 50 for i in range(200)]
+    assert gzip.decompress(b"".join(gzip_stream(iter(chunks)))) == b"".join(chunks)
+
+def test_cached_responses_get_an_etag_per_encoding(client):
+    identity = client.get("/api/market/history/AAPL", params={"period": "1y"}, headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/market/history/AAPL", params={"period": "1y"}, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+    assert compressed.headers["cache-control"].startswith("public, max-age=")
+    revalidated = client.get("/api/market/history/AAPL", params={"period": "1y"},
+                             headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+def test_middleware_weakens_the_etag_of_what_it_compresses(client):
+    client.post("/api/layouts", json={"id": "big", "name": "Big", "layout": {"windows": ["x" * 50] * 40}})
+    identity = client.get("/api/layouts/big", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/layouts/big", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in identity.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == "W/" + identity.headers["etag"]
+    revalidated = client.get("/api/layouts/big", headers={"Accept-Encoding": "gzip",
+                                                          "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+def test_streaming_exports_are_not_recompressed(client):
+    response = client.get("/api/logs/export", params={"gzip": "true"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    gzip.decompress(response.content)
@@ -0,0 +1,125 @@
+import asyncio
+
+import server
+from fakes import FakeWebSocket, settle
+
+def closed_count(cause: str) -> float:
+    return server.WS_CLOSED.values.get((cause,), 0)
+
+def test_reused_client_id_closes_the_previous_socket():
+    async def scenario():
+        manager = server.ConnectionManager()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        replaced = closed_count("replaced")
+        await manager.connect(old, "client")
+        manager.subscribe_to_ticker("client", "AAPL")
+        connection = await manager.connect(new, "client")
+        await settle()
+
+        assert old.closed[0] == server.WS_CLOSE_REPLACED
+        assert new.closed is None
+        assert manager.active_connections["client"] is connection
+        # The new connection starts without the old one's subscriptions
+        assert connection.tickers == set()
+        assert manager.ticker_subscriptions == {}
+        assert closed_count("replaced") == replaced + 1
+
+        # The old handler's cleanup leaves the new connection alone
+        manager.disconnect("client", old)
+        assert manager.active_connections["client"] is connection
+        manager.disconnect("client", new)
+
+    asyncio.run(scenario())
+
+def test_outbox_overflow_closes_slow_client(monkeypatch):
+    monkeypatch.setattr(server, "WS_OUTBOX_MAX_FRAMES", 3)
+
+    async def scenario():
+        manager = server.ConnectionManager()
+        socket = FakeWebSocket()
+        socket.stalled = asyncio.Event()
+        overflows = closed_count("overflow")
+        connection = await manager.connect(socket, "slow")
+        await connection.send_text("first")
+        await settle()  # The writer is now stuck sending "first"
+        for i in range(5):
+            await connection.send_text(f"tick {i}")
+        assert connection.overflowed
+        assert len(connection.frames) == 3
+
+        socket.stalled.set()
+        await settle()
+        assert socket.closed[0] == server.WS_CLOSE_SLOW
+        assert "slow" not in manager.active_connections
+        assert closed_count("overflow") == overflows + 1
+
+    asyncio.run(scenario())
+
+def test_reap_closes_idle_connections_without_subscriptions():
+    async def scenario():
+        manager = server.ConnectionManager()
+        idle = await manager.connect(FakeWebSocket(), "idle")
+        busy = await manager.connect(FakeWebSocket(), "busy")
+        manager.subscribe_to_ticker("busy", "AAPL")
+        later = idle.last_seen + server.WS_IDLE_SECONDS + 1
+        busy.last_seen = idle.last_seen
+
+        doomed = manager.reap(later)
+        assert [(connection, code, cause) for connection, code, _, cause in doomed] == [
+            (idle, server.WS_CLOSE_IDLE, "idle")
+        ]
+        # Speaking recently keeps a connection alive
+        idle.last_seen = later
+        assert manager.reap(later) == []
+
+        for connection in (idle, busy):
+            manager.disconnect(connection.client_id)
+
+    asyncio.run(scenario())
+
+def test_reap_closes_connections_stuck_on_a_send():
+    async def scenario():
+        manager = server.ConnectionManager()
+        socket = FakeWebSocket()
+        socket.stalled = asyncio.Event()
+        connection = await manager.connect(socket, "stuck")
+        manager.subscribe_to_ticker("stuck", "AAPL")
+        await connection.send_text("tick")
+        await settle()
+        assert connection.sending_since is not None
+
+        assert manager.reap(connection.sending_since + server.WS_SEND_TIMEOUT_SECONDS - 1) == []
+        doomed = manager.reap(connection.sending_since + server.WS_SEND_TIMEOUT_SECONDS + 1)
+        assert [(code, cause) for _, code, _, cause in doomed] == [(server.WS_CLOSE_SLOW, "stalled")]
+
+        for connection, code, reason, cause in doomed:
+            await manager.close(connection, code, reason, cause)
+        assert socket.closed[0] == server.WS_CLOSE_SLOW
+        assert manager.active_connections == {}
+        assert manager.ticker_subscriptions == {}
+
+    asyncio.run(scenario())
+
+def test_subscriptions_are_capped_per_connection(monkeypatch):
+    monkeypatch.setattr(server, "WS_MAX_SUBSCRIPTIONS", 3)
+
+    async def scenario():
+        manager = server.ConnectionManager()
+        connection = await manager.connect(FakeWebSocket(), "client")
+        assert manager.subscribe_to_ticker("client", "AAPL")
+        assert manager.subscribe_to_ticker("client", "MSFT")
+        assert manager.subscribe_to_indicator("client", "AAPL", "sma:20")
+
+        # Tickers and indicators share the cap
+        assert not manager.subscribe_to_ticker("client", "GOOG")
+        assert not manager.subscribe_to_indicator("client", "MSFT", "sma:20")
+        assert "GOOG" not in manager.ticker_subscriptions
+        # Repeating an existing subscription is not a new one
+        assert manager.subscribe_to_ticker("client", "AAPL")
+
+        manager.unsubscribe_from_ticker("client", "MSFT")
+        assert manager.subscribe_to_ticker("client", "GOOG")
+        assert connection.subscription_count() == 3
+        manager.disconnect("client")
+
+    asyncio.run(scenario())
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from indicators import IndicatorEngine, parse_indicator
+
+CLOSE = 100 + np.sin(np.arange(60) / 3) * 5
+VOLUME = 1e6 + np.cos(np.arange(60) / 5) * 2e5
+DATES = [f"2024-01-{day:02d}" if day <= 31 else f"2024-02-{day - 31:02d}" for day in range(1, 61)]
+
+def reseeded(spec, close, volume):
+    indicator = parse_indicator(spec)
+    indicator.seed(np.asarray(close, dtype=float), np.asarray(volume, dtype=float))
+    return indicator.value
+
+@pytest.mark.parametrize("spec", ["sma:20", "ema:10", "rsi:14", "vwap"])
+def test_ticks_within_a_bar_revise_it(spec):
+    indicator = parse_indicator(spec)
+    indicator.seed(CLOSE, VOLUME)
+    indicator.period = DATES[-1]
+
+    # Many polls within the last day only ever replace that day's bar
+    for price, volume in [(101.0, 1.1e6), (99.5, 1.3e6), (102.25, 1.4e6)] * 10:
+        indicator.update(price, volume, DATES[-1])
+    expected = reseeded(spec, np.append(CLOSE[:-1], price), np.append(VOLUME[:-1], volume))
+    assert indicator.value == pytest.approx(expected)
+
+@pytest.mark.parametrize("spec", ["sma:20", "ema:10", "rsi:14", "vwap"])
+def test_a_new_day_rolls_the_window(spec):
+    indicator = parse_indicator(spec)
+    indicator.seed(CLOSE, VOLUME)
+    indicator.period = DATES[-1]
+
+    indicator.update(103.0, 2e5, "2024-03-01")
+    indicator.update(104.0, 4e5, "2024-03-01")
+    indicator.update(98.0, 3e5, "2024-03-02")
+    expected = reseeded(spec, np.append(CLOSE, [104.0, 98.0]), np.append(VOLUME, [4e5, 3e5]))
+    assert indicator.value == pytest.approx(expected)
+
+def test_sma_and_vwap_stay_consistent_under_repeated_polls():
+    bars = [{"date": f"{date}T00:00:00", "close": float(close), "volume": float(volume)}
+            for date, close, volume in zip(DATES, CLOSE, VOLUME)]
+    engine = IndicatorEngine()
+    sma = engine.add("AAPL", parse_indicator("sma:20"), bars)
+    vwap = engine.add("AAPL", parse_indicator("vwap"), bars)
+
+    tick = {"ticker": "AAPL", "price": 100.0, "volume": 5000, "day_volume": 1.2e6,
+            "timestamp": f"{DATES[-1]}T15:30:00"}
+    first = engine.update([tick])
+    for _ in range(20):
+        repeated = engine.update([tick])
+    assert [message["value"] for message in repeated] == [message["value"] for message in first]
+    # Neither the window nor the volume moved on from the current day
+    assert sma.value == pytest.approx(reseeded("sma:20", np.append(CLOSE[:-1], 100.0), VOLUME))
+    assert vwap.value == pytest.approx(reseeded("vwap", np.append(CLOSE[:-1], 100.0), np.append(VOLUME[:-1], 1.2e6)))
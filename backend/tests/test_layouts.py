@@ -0,0 +1,141 @@
+import pytest
+
+LAYOUT = {
+    "id": "trading",
+    "name": "Trading",
+    "description": "Main screen",
+    "layout": {"windows": [{"title": "Chart", "position": {"x": 0, "y": 0}}], "theme": {"mode": "dark"}}
+}
+JSON_PATCH = {"Content-Type": "application/json-patch+json"}
+
+@pytest.fixture
+def saved(client):
+    response = client.post("/api/layouts", json=LAYOUT)
+    assert response.status_code == 200
+    return response.json()
+
+def test_save_inserts_then_updates_the_same_layout(client, saved):
+    assert saved["version"] == 1
+    response = client.post("/api/layouts", json=dict(LAYOUT, name="Renamed"))
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.json()["name"] == "Renamed"
+    assert response.json()["created_at"] == saved["created_at"]
+    assert client.get("/api/layouts").headers["X-Total-Count"] == "1"
+
+def test_save_with_a_stale_version_conflicts(client, saved):
+    assert client.post("/api/layouts", json=dict(LAYOUT, version=1)).status_code == 200
+    response = client.post("/api/layouts", json=dict(LAYOUT, version=1))
+    assert response.status_code == 409
+    assert client.get("/api/layouts/trading").json()["version"] == 2
+
+def test_versioned_save_never_inserts(client):
+    response = client.post("/api/layouts", json=dict(LAYOUT, id="new", version=7))
+    assert response.status_code == 404
+    assert client.get("/api/layouts/new").status_code == 404
+
+def test_stale_save_conflicts_without_the_unique_index(client, saved):
+    import server
+
+    # As before prepare_database has built the index
+    server.db.layouts.drop_indexes()
+    client.post("/api/layouts", json=dict(LAYOUT, version=1))
+    assert client.post("/api/layouts", json=dict(LAYOUT, version=1)).status_code == 409
+    assert server.db.layouts.count_documents({"id": "trading"}) == 1
+
+def test_merge_patch_changes_only_the_given_paths(client, saved):
+    response = client.patch("/api/layouts/trading", json={"layout": {"theme": {"mode": "light"}}})
+    assert response.status_code == 200
+    layout = response.json()
+    assert layout["layout"] == {"windows": LAYOUT["layout"]["windows"], "theme": {"mode": "light"}}
+    assert layout["name"] == "Trading"
+    assert layout["version"] == 2
+
+def test_merge_patch_null_removes_keys_and_clears_description(client, saved):
+    response = client.patch("/api/layouts/trading", json={"description": None, "layout": {"theme": None}})
+    assert response.status_code == 200
+    assert response.json()["description"] is None
+    assert response.json()["layout"] == {"windows": LAYOUT["layout"]["windows"]}
+
+@pytest.mark.parametrize("patch, detail", [
+    ({"name": None}, "A layout needs a name and a layout object"),
+    ({"layout": None}, "A layout needs a name and a layout object"),
+    ({"owner": "someone"}, "Only name, description, layout can be patched"),
+    ({"layout": {"": 1}}, "Unsupported key in layout: "),
+    ({"layout": {"a.b": 1}}, "Unsupported key in layout: a.b"),
+    ([1, 2], "Merge patch body must be a JSON object"),
+    ("x", "Merge patch body must be a JSON object"),
+    (5, "Merge patch body must be a JSON object"),
+])
+def test_invalid_merge_patches_are_rejected(client, saved, patch, detail):
+    response = client.patch("/api/layouts/trading", json=patch)
+    assert response.status_code == 422
+    assert response.json()["detail"] == detail
+    assert client.get("/api/layouts/trading").json()["version"] == 1
+
+def test_json_patch_operations(client, saved):
+    operations = [
+        {"op": "test", "path": "/layout/theme/mode", "value": "dark"},
+        {"op": "replace", "path": "/layout/theme/mode", "value": "light"},
+        {"op": "add", "path": "/layout/windows/-", "value": {"title": "News"}},
+        {"op": "move", "from": "/layout/windows/0", "path": "/layout/windows/1"},
+        {"op": "remove", "path": "/description"},
+        {"op": "copy", "from": "/name", "path": "/layout/title"},
+    ]
+    response = client.patch("/api/layouts/trading", json=operations, headers=JSON_PATCH)
+    assert response.status_code == 200
+    layout = response.json()
+    assert layout["layout"]["theme"] == {"mode": "light"}
+    assert [window["title"] for window in layout["layout"]["windows"]] == ["News", "Chart"]
+    assert layout["layout"]["title"] == "Trading"
+    assert layout["description"] is None
+
+def test_failed_json_patch_test_conflicts_and_changes_nothing(client, saved):
+    operations = [
+        {"op": "replace", "path": "/name", "value": "Other"},
+        {"op": "test", "path": "/layout/theme/mode", "value": "light"},
+    ]
+    response = client.patch("/api/layouts/trading", json=operations, headers=JSON_PATCH)
+    assert response.status_code == 409
+    assert client.get("/api/layouts/trading").json()["name"] == "Trading"
+
+@pytest.mark.parametrize("operations", [
+    {"op": "add"},
+    [{"op": "frobnicate", "path": "/name"}],
+    [{"op": "remove", "path": "/layout/missing"}],
+    [{"op": "add", "path": "/name"}],
+    [{"op": "replace", "path": "", "value": {}}],
+    [{"op": "add", "path": 123, "value": 1}],
+    [{"op": "remove", "path": None}],
+    [{"op": "move", "from": 5, "path": "/name"}],
+    [{"op": "copy", "from": ["name"], "path": "/layout/title"}],
+])
+def test_invalid_json_patches_are_rejected(client, saved, operations):
+    response = client.patch("/api/layouts/trading", json=operations, headers=JSON_PATCH)
+    assert response.status_code == 422
+
+def test_patch_at_a_stale_version_conflicts(client, saved):
+    response = client.patch("/api/layouts/trading", params={"version": 0}, json={"name": "Stale"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Layout is at version 1, not 0"
+    response = client.patch("/api/layouts/trading", params={"version": 1}, json={"name": "Fresh"})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+def test_patch_loses_a_race_with_a_concurrent_write(client, saved, monkeypatch):
+    import server
+
+    # Another client bumps the version between the read and the guarded write
+    find_one = server.db.layouts.find_one
+    def find_then_race(*args, **kwargs):
+        document = find_one(*args, **kwargs)
+        server.db.layouts.update_one({"id": "trading"}, {"$inc": {"version": 1}})
+        return document
+    monkeypatch.setattr(server.db.layouts, "find_one", find_then_race)
+
+    response = client.patch("/api/layouts/trading", json={"name": "Lost"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Layout was modified by another client"
+
+def test_patch_of_a_missing_layout_is_not_found(client):
+    assert client.patch("/api/layouts/missing", json={"name": "X"}).status_code == 404
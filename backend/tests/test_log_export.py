@@ -0,0 +1,90 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+
+SOURCE = {"source": "market_api"}
+
+@pytest.fixture
+def logs(client):
+    import server
+
+    # One source, so the app's own startup log never shows up in an export
+    documents = [{
+        "source": "market_api",
+        "level": "ERROR" if i % 5 == 0 else "INFO",
+        "message": f"message {i}",
+        "timestamp": datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i),
+        "additional_data": {"n": i}
+    } for i in range(25)]
+    server.db.logs.insert_many(documents)
+    return [str(document["_id"]) for document in documents]
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_ndjson_export_in_id_order(client, logs):
+    response = client.get("/api/logs/export", params=SOURCE)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [row["_id"] for row in ndjson(response)] == logs
+
+def test_export_resumes_after_the_cursor(client, logs):
+    exported = []
+    cursor = None
+    while True:
+        params = dict(SOURCE, limit=10)
+        if cursor:
+            params["cursor"] = cursor
+        rows = ndjson(client.get("/api/logs/export", params=params))
+        if not rows:
+            break
+        exported += [row["_id"] for row in rows]
+        cursor = rows[-1]["_id"]
+    # Every document exactly once, across three pages
+    assert exported == logs
+
+def test_invalid_cursor_is_rejected(client, logs):
+    response = client.get("/api/logs/export", params=dict(SOURCE, cursor="not-an-id"))
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("endpoint", ["/api/logs/export", "/api/logs"])
+@pytest.mark.parametrize("param", ["from_date", "to_date"])
+def test_invalid_dates_are_rejected(client, logs, endpoint, param):
+    response = client.get(endpoint, params={param: "bad"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"{param} must be an ISO 8601 date or datetime"
+
+def test_export_date_range(client, logs):
+    params = dict(SOURCE, from_date="2024-01-01T00:10:00", to_date="2024-01-01T00:12:00")
+    assert [row["message"] for row in ndjson(client.get("/api/logs/export", params=params))] == \
+        ["message 10", "message 11", "message 12"]
+
+def test_csv_export_with_filters(client, logs):
+    response = client.get("/api/logs/export", params=dict(SOURCE, format="csv", level="ERROR"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["message"] for row in rows] == [f"message {i}" for i in range(0, 25, 5)]
+    assert rows[1]["_id"] == logs[5]
+    assert rows[1]["timestamp"] == "2024-01-01T00:05:00"
+    assert json.loads(rows[1]["additional_data"]) == {"n": 5}
+    assert rows[1]["stack_trace"] == ""
+
+def test_gzip_export(client, logs):
+    response = client.get("/api/logs/export", params=dict(SOURCE, format="csv", gzip="true"))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="logs.csv.gz"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+    assert [row["_id"] for row in rows] == logs
+
+def test_export_streams_in_batches(client, logs, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 4)
+    chunks = list(server.iter_log_export(server.db.logs.find(SOURCE).sort("_id", 1), "ndjson"))
+    assert [chunk.count("\n") for chunk in chunks] == [4, 4, 4, 4, 4, 4, 1]
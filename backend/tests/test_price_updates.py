@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from fakes import FakeWebSocket, settle
+
+def tick(ticker: str, price: float, volume: int = 1000) -> dict:
+    return {"ticker": ticker, "price": price, "change": 0.0, "change_percent": 0.0,
+            "volume": volume, "timestamp": "2024-01-02T15:30:00"}
+
+@pytest.fixture
+def prices(monkeypatch):
+    """Fresh price pipeline state, with a clean manager and no indicators"""
+    monkeypatch.setattr(server, "manager", server.ConnectionManager())
+    monkeypatch.setattr(server, "last_prices", {})
+    monkeypatch.setattr(server, "pending_prices", {})
+    monkeypatch.setattr(server, "flush_task", None)
+    monkeypatch.setattr(server, "indicator_engine", None)
+    return monkeypatch
+
+async def subscriber(*tickers: str) -> FakeWebSocket:
+    socket = FakeWebSocket()
+    await server.manager.connect(socket, "client")
+    for ticker in tickers:
+        server.manager.subscribe_to_ticker("client", ticker)
+    return socket
+
+def test_updates_go_out_immediately_without_coalescing(prices):
+    prices.setattr(server, "COALESCE_SECONDS", 0)
+
+    async def scenario():
+        socket = await subscriber("AAPL")
+        await server.handle_price_update({"updates": [tick("AAPL", 100), tick("MSFT", 300)]})
+        await settle()
+        assert socket.messages() == [tick("AAPL", 100)]
+        assert server.pending_prices == {}
+        assert server.flush_task is None
+
+    asyncio.run(scenario())
+
+def test_unchanged_ticks_are_suppressed(prices):
+    prices.setattr(server, "COALESCE_SECONDS", 0)
+
+    async def scenario():
+        socket = await subscriber("AAPL")
+        unchanged = server.PRICE_UPDATES.values.get(("unchanged",), 0)
+        await server.handle_price_update({"updates": [tick("AAPL", 100)]})
+        await server.handle_price_update({"updates": [tick("AAPL", 100)]})
+        await server.handle_price_update({"updates": [tick("AAPL", 100, volume=1200)]})
+        await server.handle_price_update({"updates": [tick("AAPL", 101, volume=1200)]})
+        await settle()
+        assert socket.messages() == [tick("AAPL", 100), tick("AAPL", 100, volume=1200),
+                                     tick("AAPL", 101, volume=1200)]
+        assert server.PRICE_UPDATES.values[("unchanged",)] == unchanged + 1
+        # The cache still holds the newest update
+        assert server.cached_price("AAPL") == tick("AAPL", 101, volume=1200)
+
+    asyncio.run(scenario())
+
+def test_changes_within_the_window_are_coalesced(prices):
+    prices.setattr(server, "COALESCE_SECONDS", 0.05)
+
+    async def scenario():
+        socket = await subscriber("AAPL", "MSFT")
+        await server.handle_price_update({"updates": [tick("AAPL", 100), tick("MSFT", 300)]})
+        await server.handle_price_update({"updates": [tick("AAPL", 101)]})
+        await settle()
+        assert socket.sent == []
+        assert server.flush_task is not None
+
+        await server.flush_task
+        await settle()
+        # One batch, holding only the latest update per ticker
+        assert socket.messages() == [tick("AAPL", 101), tick("MSFT", 300)]
+        assert server.pending_prices == {}
+        assert server.flush_task is None
+
+        # The next change opens a new window
+        await server.handle_price_update({"updates": [tick("MSFT", 301)]})
+        await server.flush_task
+        await settle()
+        assert socket.messages()[-1] == tick("MSFT", 301)
+
+    asyncio.run(scenario())
+
+def test_new_subscriber_gets_the_cached_snapshot(prices):
+    prices.setattr(server, "COALESCE_SECONDS", 0)
+
+    async def scenario():
+        await server.handle_price_update({"updates": [tick("AAPL", 100)]})
+        socket = FakeWebSocket()
+        handler = asyncio.create_task(server.websocket_endpoint(socket, "client"))
+        socket.push({"action": "subscribe", "ticker": "AAPL"})
+        await settle(10)
+        ack, snapshot = socket.messages()
+        assert ack == {"type": "subscription", "status": "success", "ticker": "AAPL"}
+        assert snapshot == tick("AAPL", 100)
+
+        socket.incoming.put_nowait(None)
+        await handler
+
+    asyncio.run(scenario())
+
+def test_stale_cached_prices_are_evicted(prices):
+    prices.setattr(server, "COALESCE_SECONDS", 0)
+
+    async def scenario():
+        stale = time.monotonic() - server.LAST_PRICE_TTL_SECONDS - 1
+        server.last_prices["OLD"] = (tick("OLD", 5), stale)
+        server.last_prices["AAPL"] = (tick("AAPL", 100), time.monotonic())
+        await server.handle_price_update({"updates": [tick("MSFT", 300)]})
+        assert server.cached_price("OLD") is None
+        assert server.cached_price("AAPL") == tick("AAPL", 100)
+        assert server.cached_price("MSFT") == tick("MSFT", 300)
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+import asyncio
+
+import msgpack
+import pytest
+
+import server
+from fakes import FakeWebSocket, settle
+from protocols import JsonProtocol, MsgpackProtocol, PackedProtocol
+
+UPDATE = {"ticker": "AAPL", "price": 101.5, "change": 1.5, "change_percent": 1.5,
+          "volume": 1000, "timestamp": "2024-01-02T15:30:00"}
+
+@pytest.mark.parametrize("protocol_class", [MsgpackProtocol, PackedProtocol])
+def test_freed_symbol_ids_are_reused_lowest_first(protocol_class):
+    protocol = protocol_class()
+    assert [protocol.register_symbol(t) for t in ("A", "B", "C", "D")] == [0, 1, 2, 3]
+    # Registering again keeps the id
+    assert protocol.register_symbol("B") == 1
+
+    protocol.release_symbol("C")
+    protocol.release_symbol("A")
+    protocol.release_symbol("A")  # Releasing twice frees nothing more
+    assert protocol.register_symbol("E") == 0
+    assert protocol.register_symbol("F") == 2
+    assert protocol.register_symbol("G") == 4
+
+@pytest.mark.parametrize("protocol_class", [MsgpackProtocol, PackedProtocol])
+def test_max_symbols_is_enforced(protocol_class):
+    protocol = protocol_class(max_symbols=2)
+    protocol.register_symbol("A")
+    protocol.register_symbol("B")
+    with pytest.raises(ValueError, match="At most 2 symbols"):
+        protocol.register_symbol("C")
+
+    protocol.release_symbol("A")
+    assert protocol.register_symbol("C") == 0
+    assert set(protocol.symbols.values()) == {0, 1}
+
+class FailingProtocol(JsonProtocol):
+    async def send_prices(self, websocket, updates, encoded):
+        raise RuntimeError("encoding failed")
+
+def test_one_failing_client_does_not_stop_the_broadcast():
+    async def scenario():
+        manager = server.ConnectionManager()
+        sockets = {client_id: FakeWebSocket() for client_id in ("first", "broken", "last")}
+        for client_id, socket in sockets.items():
+            protocol = FailingProtocol() if client_id == "broken" else MsgpackProtocol()
+            await manager.connect(socket, client_id, protocol)
+            manager.subscribe_to_ticker(client_id, "AAPL")
+            protocol.register_symbol("AAPL")
+
+        await manager.broadcast_price_updates([UPDATE])
+        await settle()
+
+        assert sockets["broken"].sent == []
+        for client_id in ("first", "last"):
+            frames = [msgpack.unpackb(frame) for frame in sockets[client_id].sent]
+            assert [frame["updates"] for frame in frames] == [[[0, 101.5, 1.5, 1.5, 1000]]]
+        for client_id in sockets:
+            manager.disconnect(client_id)
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+import time
+
+import mongomock
+from fastapi.testclient import TestClient
+from pymongo.errors import DuplicateKeyError
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_failed_migration_is_reported_and_retried(monkeypatch, caplog):
+    import server
+
+    attempts = []
+    migrate_layouts = server.migrate_layouts
+    def flaky_migration():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise DuplicateKeyError("E11000 duplicate key error collection: optra.layouts index: id_1")
+        migrate_layouts()
+
+    monkeypatch.setattr(server, "db", mongomock.MongoClient().optra)
+    monkeypatch.setattr(server, "migrate_layouts", flaky_migration)
+    monkeypatch.setattr(server, "MONGO_RETRY_SECONDS", 0.2)
+    server.readiness["mongo"] = False
+
+    with TestClient(server.app) as client:
+        assert wait_for(lambda: attempts)
+        response = client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json()["errors"]["mongo"].startswith("Migration failed: E11000")
+        assert "Layout migration failed" in caplog.text
+
+        # The retry succeeds, clears the error and writes the startup log
+        assert wait_for(lambda: server.readiness["mongo"])
+        response = client.get("/api/ready")
+        assert response.status_code == 200
+        assert "errors" not in response.json()
+        assert wait_for(lambda: server.db.logs.find_one({"message": "Optra backend started"}))
+        assert "prepare_database" not in {task.get_name() for task in server.background_tasks}
+    assert not server.background_tasks
@@ -0,0 +1,32 @@
+import asyncio
+
+import server
+from fakes import FakeWebSocket, settle
+
+def test_replaced_handler_stops_acting_for_the_client_id():
+    async def scenario():
+        old, new = FakeWebSocket(), FakeWebSocket()
+        old_handler = asyncio.create_task(server.websocket_endpoint(old, "dup"))
+        await settle()
+        new_handler = asyncio.create_task(server.websocket_endpoint(new, "dup"))
+        await settle()
+        assert old.closed[0] == server.WS_CLOSE_REPLACED
+
+        # The old peer sends before its close handshake completes
+        old.push({"action": "subscribe", "ticker": "MSFT"})
+        await settle()
+        assert old_handler.done()
+        connection = server.manager.active_connections["dup"]
+        assert connection.websocket is new
+        assert connection.tickers == set()
+        assert "MSFT" not in server.manager.ticker_subscriptions
+
+        # The new connection works as usual
+        new.push({"action": "subscribe", "ticker": "AAPL"})
+        await settle()
+        assert server.manager.ticker_subscriptions["AAPL"] == {"dup"}
+        new.incoming.put_nowait(None)
+        await new_handler
+        assert "dup" not in server.manager.active_connections
+
+    asyncio.run(scenario())
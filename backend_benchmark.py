@@ -0,0 +1,469 @@
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import datetime
+import logging
+
+import httpx
+import mongomock
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+import server
+from protocols import PROTOCOLS
+from indicators import IndicatorEngine, parse_indicator, history_arrays
+
+# Keep per-request client logging out of the benchmark output
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Run in a fresh interpreter so module caching doesn't hide import cost.
+# Prints seconds to import the app and seconds until the first response.
+STARTUP_SCRIPT = """
+import sys, time, asyncio, httpx
+start = time.perf_counter()
+sys.path.insert(0, {backend_dir!r})
+import server
+imported = time.perf_counter()
+
+async def first_request():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.get("/api/health")
+        response.raise_for_status()
+
+asyncio.run(first_request())
+print(imported - start, time.perf_counter() - start)
+"""
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class FakeWebSocket:
+    """Stand-in client socket that just counts what the server sends it"""
+    def __init__(self):
+        self.messages = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_json(self, data):
+        self.messages += 1
+
+    async def send_text(self, data):
+        self.messages += 1
+
+    async def send_bytes(self, data):
+        self.messages += 1
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+def resident_bytes():
+    # Current RSS; ru_maxrss would only ever show the peak
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+class OptraBenchmark:
+    def __init__(self, iterations=200, only=None, startup_budget=1.0):
+        self.iterations = iterations
+        self.only = only
+        self.startup_budget = startup_budget
+        self.startup_over_budget = None
+        self.results = []
+        self.client = None
+
+    def selected(self, name):
+        return not self.only or self.only.lower() in name.lower()
+
+    def record(self, name, timings, items=1):
+        """Summarize a list of per-call timings"""
+        timings = sorted(timings)
+        total = sum(timings)
+        result = {
+            "name": name,
+            "calls": len(timings),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(percentile(timings, 99) * 1000, 3),
+            "per_sec": round(len(timings) * items / total, 1) if total else None
+        }
+        self.results.append(result)
+        print(f"⏱  {name}: p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms, "
+              f"p99 {result['p99_ms']}ms ({result['per_sec']}/s)")
+        return result
+
+    def measure(self, name, func, items=1, iterations=None):
+        """Time a synchronous callable"""
+        if not self.selected(name):
+            return None
+        timings = []
+        for _ in range(iterations or self.iterations):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return self.record(name, timings, items)
+
+    async def measure_async(self, name, func, items=1, iterations=None):
+        """Time an async callable"""
+        if not self.selected(name):
+            return None
+        timings = []
+        for _ in range(iterations or self.iterations):
+            start = time.perf_counter()
+            await func()
+            timings.append(time.perf_counter() - start)
+        return self.record(name, timings, items)
+
+    async def measure_request(self, name, method, url, expected_status=200, **kwargs):
+        """Time an in-process HTTP request through the ASGI app"""
+        async def call():
+            response = await self.client.request(method, url, **kwargs)
+            if response.status_code != expected_status:
+                raise RuntimeError(f"{name}: expected {expected_status}, got {response.status_code}: {response.text[:200]}")
+        return await self.measure_async(name, call)
+
+    def make_log_documents(self, count):
+        """Build documents shaped like rows read back from db.logs"""
+        now = datetime.datetime.now()
+        docs = []
+        for i in range(count):
+            doc = {
+                "_id": ObjectId(),
+                "source": random.choice(["system", "market_api", "database"]),
+                "level": random.choice(["INFO", "WARNING", "ERROR", "DEBUG"]),
+                "message": f"Processed request {i} in {random.randint(5, 2000)}ms",
+                "timestamp": now - datetime.timedelta(seconds=i),
+                "stack_trace": None,
+                "additional_data": {
+                    "duration": random.randint(5, 2000),
+                    "method": "GET",
+                    "path": "/api/market",
+                    "request_id": f"req_{i}"
+                }
+            }
+            docs.append(doc)
+        return docs
+
+    def setup_database(self, log_count=10000, layout_count=50):
+        """Point the app at an in-memory Mongo stand-in seeded with data"""
+        server.db = mongomock.MongoClient().optra
+        server.db.logs.insert_many(self.make_log_documents(log_count))
+        for i in range(layout_count):
+            server.db.layouts.insert_one({
+                "id": f"layout-{i}",
+                "name": f"Layout {i}",
+                "description": "Benchmark layout",
+                "layout": {"windows": [{"title": f"Window {w}", "position": {"x": w, "y": w}} for w in range(20)]},
+                "created_at": datetime.datetime.now(),
+                "updated_at": datetime.datetime.now(),
+                "version": 1
+            })
+        server.migrate_layouts()
+
+    def bench_serialization(self, sizes=(1000, 10000)):
+        """Compare the generic encoder against the pre-encoded fast path"""
+        for size in sizes:
+            docs = self.make_log_documents(size)
+
+            def generic():
+                logs = [dict(doc, _id=str(doc["_id"])) for doc in docs]
+                json.dumps(jsonable_encoder({"data": logs, "total": size, "limit": size, "offset": 0})).encode("utf-8")
+
+            def fast():
+                server.fast_json_response({"data": docs, "total": size, "limit": size, "offset": 0})
+
+            self.measure(f"serialize logs page ({size} docs) - jsonable_encoder", generic, size, iterations=5)
+            self.measure(f"serialize logs page ({size} docs) - fast path", fast, size, iterations=5)
+
+    async def bench_logs(self):
+        """Log query, export and ingestion endpoints"""
+        await self.measure_request("GET /api/logs", "GET", "/api/logs")
+        await self.measure_request("GET /api/logs level=ERROR", "GET", "/api/logs", params={"level": "ERROR"})
+        await self.measure_request("GET /api/logs source=system", "GET", "/api/logs", params={"source": "system"})
+        await self.measure_request("GET /api/logs offset=5000", "GET", "/api/logs", params={"offset": 5000})
+        await self.measure_request("GET /api/logs limit=1000", "GET", "/api/logs", params={"limit": 1000})
+        from_date = (datetime.datetime.now() - datetime.timedelta(hours=1)).isoformat()
+        await self.measure_request("GET /api/logs from_date=-1h", "GET", "/api/logs", params={"from_date": from_date})
+        await self.measure_request("GET /api/logs/export limit=1000", "GET", "/api/logs/export", params={"limit": 1000})
+
+        entry = {"source": "benchmark", "level": "INFO", "message": "Benchmark log entry"}
+        await self.measure_request("POST /api/logs", "POST", "/api/logs", json=entry)
+        await self.measure_request("POST /api/logs/bulk (100)", "POST", "/api/logs/bulk", json=[entry] * 100)
+
+        # A refused request should cost far less than the work it protects
+        rate, burst = server.INGEST.rate, server.INGEST.burst
+        server.INGEST.rate, server.INGEST.burst = 0.001, 1
+        server.INGEST.buckets.clear()
+        await self.client.post("/api/logs", json=entry)
+        await self.measure_request("POST /api/logs shed (429)", "POST", "/api/logs", expected_status=429, json=entry)
+        server.INGEST.rate, server.INGEST.burst = rate, burst
+
+    async def bench_market(self):
+        """Quote, history and search endpoints"""
+        await self.measure_request("GET /api/market/quote", "GET", "/api/market/quote/AAPL")
+        for period in ("5d", "1mo", "1y"):
+            await self.measure_request(f"GET /api/market/history period={period}", "GET",
+                                       "/api/market/history/AAPL", params={"period": period})
+        # The client sends Accept-Encoding: gzip by default, so the above are compressed cache hits
+        await self.measure_request("GET /api/market/history period=1y identity", "GET", "/api/market/history/AAPL",
+                                   params={"period": "1y"}, headers={"Accept-Encoding": "identity"})
+        response = await self.client.get("/api/market/history/AAPL", params={"period": "1y"})
+        await self.measure_request("GET /api/market/history period=1y revalidated (304)", "GET",
+                                   "/api/market/history/AAPL", expected_status=304, params={"period": "1y"},
+                                   headers={"If-None-Match": response.headers["etag"]})
+        await self.measure_request("GET /api/market/history period=1y indicators", "GET", "/api/market/history/AAPL",
+                                   params={"period": "1y", "indicators": "sma:20,ema:50,rsi:14,vwap"})
+        tickers = ",".join(f"TICK{t}" for t in range(20))
+        await self.measure_request("GET /api/market/history aligned 20 tickers 1y", "GET", "/api/market/history",
+                                   params={"tickers": tickers, "period": "1y"})
+        await self.measure_request("GET /api/market/history aligned 20 tickers 1y returns+correlation", "GET",
+                                   "/api/market/history",
+                                   params={"tickers": tickers, "period": "1y", "returns": "simple", "correlation": "true"})
+        await self.measure_request("GET /api/market/search broad", "GET", "/api/market/search/A")
+        await self.measure_request("GET /api/market/search narrow", "GET", "/api/market/search/NVDA")
+
+    async def bench_layouts(self):
+        """Layout list, lookup, save and patch endpoints"""
+        await self.measure_request("GET /api/layouts", "GET", "/api/layouts")
+        await self.measure_request("GET /api/layouts/{id}", "GET", "/api/layouts/layout-7")
+        await self.measure_request("GET /api/layouts/{id} miss", "GET", "/api/layouts/missing", expected_status=404)
+        layout = {"id": "bench-layout", "name": "Bench", "layout": {"windows": []}}
+        await self.measure_request("POST /api/layouts", "POST", "/api/layouts", json=layout)
+        await self.measure_request("PATCH /api/layouts/{id}", "PATCH", "/api/layouts/bench-layout",
+                                   json={"layout": {"windows": [{"title": "Moved", "position": {"x": 1, "y": 2}}]}})
+
+    async def bench_broadcast(self, fanouts=(10, 100, 1000), tickers=20):
+        """Fan-out of one tick's price updates to N sockets per wire protocol"""
+        now = datetime.datetime.now().isoformat()
+        updates = [
+            {
+                "type": "price_update",
+                "ticker": f"TICK{t}",
+                "price": 150.25 + t,
+                "change": 2.35,
+                "change_percent": 1.58,
+                "volume": 28456789,
+                "timestamp": now
+            }
+            for t in range(tickers)
+        ]
+        for name, protocol_class in PROTOCOLS.items():
+            for fanout in fanouts:
+                manager = server.ConnectionManager()
+                for i in range(fanout):
+                    protocol = protocol_class()
+                    await manager.connect(FakeWebSocket(), f"client-{i}", protocol)
+                    for update in updates:
+                        protocol.register_symbol(update["ticker"])
+                        manager.subscribe_to_ticker(f"client-{i}", update["ticker"])
+
+                async def broadcast():
+                    await manager.broadcast_price_updates(updates)
+                    # Let every connection's writer task flush what was queued
+                    while any(connection.frames for connection in manager.active_connections.values()):
+                        await asyncio.sleep(0)
+
+                await self.measure_async(f"broadcast {tickers} tickers to {fanout} subscribers ({name})",
+                                         broadcast, items=fanout, iterations=min(self.iterations, 50))
+                # Stop the writer tasks rather than leave them pending on a
+                # manager that is about to be dropped
+                for client_id in list(manager.active_connections):
+                    manager.disconnect(client_id)
+                await asyncio.sleep(0)
+
+    def bench_startup(self, runs=5):
+        """Cold import of the app plus its first request, against a budget"""
+        if not self.selected("startup"):
+            return
+        imports, first_requests = [], []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT.format(backend_dir=BACKEND_DIR)],
+                                    capture_output=True, text=True, check=True).stdout
+            imported, first_request = map(float, output.split()[-2:])
+            imports.append(imported)
+            first_requests.append(first_request)
+        self.record("startup: import server", imports)
+        result = self.record("startup: import + first request", first_requests)
+        if result["p50_ms"] > self.startup_budget * 1000:
+            self.startup_over_budget = result["p50_ms"]
+
+    def bench_indicators(self, tickers=20, specs=("sma:20", "ema:50", "rsi:14", "vwap")):
+        """Seeding indicators from a year of history, and advancing them per tick"""
+        bars = server.mock_history_bars("1y")
+        self.measure(f"seed {len(specs)} indicators from {len(bars)} bars",
+                     lambda: [parse_indicator(spec).seed(*history_arrays(bars)) for spec in specs],
+                     items=len(specs), iterations=min(self.iterations, 50))
+
+        engine = IndicatorEngine()
+        for t in range(tickers):
+            for spec in specs:
+                engine.add(f"TICK{t}", parse_indicator(spec), bars)
+        now = datetime.datetime.now().isoformat()
+        updates = [{"ticker": f"TICK{t}", "price": 150.0 + t, "volume": 1000, "timestamp": now} for t in range(tickers)]
+        self.measure(f"advance {len(specs)} indicators on {tickers} tickers", lambda: engine.update(updates),
+                     items=tickers * len(specs))
+
+    async def run(self):
+        self.bench_startup()
+        self.setup_database()
+        # Every benchmark request comes from one client; measure the handlers,
+        # not the per-client rate limits
+        for priority in (server.INGEST, server.EXPORT):
+            priority.rate = None
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            self.client = client
+            await self.measure_request("GET /api/health", "GET", "/api/health")
+            await self.bench_logs()
+            await self.bench_market()
+            await self.bench_layouts()
+        await self.bench_broadcast()
+        self.bench_indicators()
+        self.bench_serialization()
+
+    async def soak(self, connections=50000, duration=3600.0, tick=1.0, report_every=60.0,
+                   tickers=50, subscriptions=5, churn=0.01):
+        """Hold `connections` simulated WebSocket clients open for `duration`
+        seconds, sending a price tick every `tick` seconds and replacing a
+        `churn` fraction of clients each tick (half of them reusing their
+        client_id). Reports memory and CPU per connection over time and
+        returns the relative growth in memory per connection."""
+        rng = random.Random(0)
+        manager = server.ConnectionManager()
+        names = [f"TICK{t}" for t in range(tickers)]
+
+        async def open_client(client_id):
+            await manager.connect(FakeWebSocket(), client_id, server.JsonProtocol())
+            for ticker in rng.sample(names, subscriptions):
+                manager.subscribe_to_ticker(client_id, ticker)
+
+        baseline_rss = resident_bytes()
+        for i in range(connections):
+            await open_client(f"client-{i}")
+        await asyncio.sleep(0)
+        print(f"🔌 {connections} connections open, {subscriptions} subscriptions each")
+        print(f"{'elapsed':>8} {'conns':>7} {'rss MB':>8} {'KB/conn':>8} {'cpu us/conn/tick':>17} {'frames/tick':>12}")
+
+        reports = []
+        next_client = connections
+        started = time.monotonic()
+        next_report = started + report_every
+        cpu_started, ticks, frames_before = time.process_time(), 0, sum(server.BROADCAST_MESSAGES.values.values())
+        while time.monotonic() - started < duration:
+            now = datetime.datetime.now().isoformat()
+            updates = [{"type": "price_update", "ticker": ticker, "price": rng.uniform(100, 200), "change": 0.0,
+                        "change_percent": 0.0, "volume": rng.randint(1, 10 ** 6), "timestamp": now} for ticker in names]
+            await manager.broadcast_price_updates(updates)
+
+            # Churn: drop some clients; replace half of them under the same id
+            for client_id in rng.sample(list(manager.active_connections), int(len(manager.active_connections) * churn)):
+                if rng.random() < 0.5:
+                    await open_client(client_id)
+                else:
+                    manager.disconnect(client_id)
+                    await open_client(f"client-{next_client}")
+                    next_client += 1
+            for connection, code, reason, cause in manager.reap(time.monotonic()):
+                await manager.close(connection, code, reason, cause)
+
+            ticks += 1
+            await asyncio.sleep(tick)
+            if time.monotonic() >= next_report:
+                count = len(manager.active_connections)
+                frames = sum(server.BROADCAST_MESSAGES.values.values())
+                per_connection = (resident_bytes() - baseline_rss) / count
+                cpu = (time.process_time() - cpu_started) / ticks / count
+                reports.append(per_connection)
+                print(f"{time.monotonic() - started:>7.0f}s {count:>7} {resident_bytes() / 2 ** 20:>8.1f} "
+                      f"{per_connection / 1024:>8.2f} {cpu * 1e6:>17.2f} {(frames - frames_before) / ticks:>12.0f}")
+                cpu_started, ticks, frames_before = time.process_time(), 0, frames
+                next_report += report_every
+
+        for client_id in list(manager.active_connections):
+            manager.disconnect(client_id)
+        await asyncio.sleep(0)  # let the cancelled writers finish
+        # The first interval still includes allocator warm-up
+        reports = reports[1:] if len(reports) > 2 else reports
+        if len(reports) < 2:
+            return 0.0
+        return reports[-1] / reports[0] - 1
+
+    def compare(self, baseline, threshold):
+        """Return the benchmarks whose p50 regressed by more than threshold"""
+        previous = {result["name"]: result for result in baseline.get("results", [])}
+        regressions = []
+        for result in self.results:
+            before = previous.get(result["name"])
+            if not before or not before["p50_ms"]:
+                continue
+            change = result["p50_ms"] / before["p50_ms"] - 1
+            if change > threshold:
+                regressions.append((result["name"], before["p50_ms"], result["p50_ms"], change))
+        return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Optra backend in-process")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per benchmark")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--soak", action="store_true", help="run the WebSocket connection soak test instead")
+    parser.add_argument("--soak-connections", type=int, default=50000, help="simulated WebSocket connections")
+    parser.add_argument("--soak-duration", type=float, default=3600.0, help="soak length in seconds")
+    parser.add_argument("--soak-report", type=float, default=60.0, help="seconds between soak reports")
+    parser.add_argument("--startup-budget", type=float, default=1.0,
+                        help="seconds allowed for a cold import plus first request (p50)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    random.seed(0)
+    benchmark = OptraBenchmark(iterations=args.iterations, only=args.only, startup_budget=args.startup_budget)
+    if args.soak:
+        growth = asyncio.run(benchmark.soak(args.soak_connections, args.soak_duration, report_every=args.soak_report))
+        if growth > args.threshold:
+            print(f"\n❌ Memory per connection grew {growth:.0%} over the soak")
+            return 1
+        print(f"\n✅ Memory per connection changed {growth:+.0%} over the soak")
+        return 0
+
+    asyncio.run(benchmark.run())
+    status = 0
+
+    if benchmark.startup_over_budget is not None:
+        print(f"\n❌ Startup took {benchmark.startup_over_budget}ms, over the {args.startup_budget:.2f}s budget")
+        status = 1
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "results": benchmark.results
+            }, f, indent=2)
+        print(f"\n💾 Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = benchmark.compare(json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions over {args.threshold:.0%}:")
+            for name, before, after, change in regressions:
+                print(f"  - {name}: p50 {before}ms -> {after}ms (+{change:.0%})")
+            return 1
+        print(f"\n✅ No regressions over {args.threshold:.0%} against {args.compare}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())